@@ -7,115 +7,84 @@
 # Outputs a csv file with the same schema '[ipo_firm, year, patent_cnt, patent_ids]', 
 # but with adjusted patent lists per year. 
 #
+# firm_year_patent.py writes the same file in the run that counts the patents by grant year, this
+# script rebuilds it from a firm_year_patentcnt.csv in dependent_data/.
+#
+# Usage (from the repository folder): python scripts/adjust_application_date.py [--last-year 2016]
+#
 #########################################################################################
 
+import argparse
 import csv
-import math
 import time
+import numpy as np
+from tsv_cache import load_columns
+from tsv_reader import read_rows
+from firm_year_buckets import bucket_patents
+from id_codes import MISSING
+
+# year bounds (buckets run from each firm's Founding year to --last-year)
+parser = argparse.ArgumentParser(description='Patent counts per IPO firm and application year.')
+parser.add_argument('--last-year', type=int, default=2016,
+					help='last year bucket, and last application year counted (default 2016)')
+args = parser.parse_args()
 
 # start time
 start_time = time.ctime()
 
-# create the output file
-print('CREATING OUTPUT FILE\n')
-
-# create an output file (firm year patent cnt)
-output = open('outputs/firm_year_patentcnt_REVISED.csv', 'w', newline="\n", encoding='utf-8-sig')
-fyp_2 = csv.writer(output, delimiter=',')
-header = ['ipo_firm', 'year', 'patent_cnt', 'patent_ids']
-fyp_2.writerow(header)
-
-
 print('READING FILES\n')
 
-# load in the application file
-applications_file = open('dependent_data/application.tsv', encoding='utf-8-sig')
-applications = csv.DictReader(applications_file, delimiter="\t")
-
-# create an application dictionary
-app_dict = {}
-cnt = 0
-for row in applications:
-	cnt+=1
-
-	patent_id = row['patent_id']
-	date = row['date']
-
-	app_dict[patent_id] = date
-
-print('Application data size: ' + str(cnt))
-print(len(app_dict))
+# load in the application columns (parsed once, then read from the cache, see tsv_cache.py)
+applications = load_columns('dependent_data/application.tsv', {'patent_id': 'str', 'date': 'year'})
+print('Application data size: ' + str(len(applications['patent_id'])))
 
-# load in the firm_year_patentcnt data
-fyp_file = open('dependent_data/firm_year_patentcnt.csv', encoding='utf-8-sig')
-fyp = csv.DictReader(fyp_file, delimiter=",")
-
-firm_patent_dict = {}
-for row in fyp:
-	ipo_firm = row['ipo_firm']
-	patent_ids = row['patent_ids']
+# load in the firm_year_patentcnt data, (firm, patent) pairs with the firms numbered in order
+fyp = read_rows('dependent_data/firm_year_patentcnt.csv', ['ipo_firm', 'patent_ids'], delimiter=",")
 
+firm_numbers = {}
+pair_firms = []
+pair_patent_ids = []
+for ipo_firm, patent_ids in fyp:
 	if not patent_ids == '':
 		patent_id_list = patent_ids.split('; ')
+		firm = firm_numbers.setdefault(ipo_firm, len(firm_numbers))
+		pair_firms += [firm] * len(patent_id_list)
+		pair_patent_ids += patent_id_list
 
-		if ipo_firm not in firm_patent_dict:
-			firm_patent_dict[ipo_firm] = patent_id_list
-		else:
-			firm_patent_dict[ipo_firm] = firm_patent_dict[ipo_firm] + patent_id_list
+# patents are numbered by their sorted IDs
+patent_ids, pair_patents = np.unique(np.array(pair_patent_ids, dtype=np.str_), return_inverse=True)
 
-print(len(firm_patent_dict['02 Micro International Limited']))
-print(firm_patent_dict['02 Micro International Limited'])
-print(app_dict[firm_patent_dict['02 Micro International Limited'][0]])
+# create an application year table of the patents (like a dictionary, the last row wins)
+app_year = np.full(len(patent_ids), MISSING, dtype=np.int64)
+if len(patent_ids):
+	codes = np.minimum(np.searchsorted(patent_ids, applications['patent_id']), len(patent_ids) - 1)
+	found = np.flatnonzero(patent_ids[codes] == applications['patent_id'])
+	last_codes, last_in_reversed = np.unique(codes[found][::-1], return_index=True)
+	app_year[last_codes] = applications['date'][found[::-1][last_in_reversed]]
 
 # load in the ipo file
-ipo_file = open('dependent_data/ipo_10000.csv', encoding='utf-8-sig')
-ipo = csv.DictReader(ipo_file, delimiter=",")
+ipo = read_rows('dependent_data/ipo_10000.csv', ['firm', 'Founding'], delimiter=",")
 
 # go through the ipo file and get the start dates
-# print('INGESTING IPOS\n')
 ipo_start_dates = {}
-for i in ipo:
-	ipo_firm = i['firm'].strip()
-	start_date = i['Founding'].strip()
-	ipo_start_dates[ipo_firm] = start_date
+for ipo_firm, start_date in ipo:
+	ipo_start_dates[ipo_firm.strip()] = start_date.strip()
 
+ipo_firms = list(firm_numbers)
+first_years = [int(ipo_start_dates[ipo]) for ipo in ipo_firms]
 
-# go through the ipo with patent and perform actions
+# bucket the patents of every firm by application year
 print('STARTING COMPUTATION PROCESS\n')
-for ipo, patent_list in firm_patent_dict.items():
-	# print(ipo)
-	start_date = int(ipo_start_dates[ipo])
-	# print(start_date)
-
-	#generate "buckets" for every year from start date to 2016
-	year_patents = {}
-	for year in range(start_date, 2017): # REMEMBER TO CHANGE THIS BACK TO 2017
-		year_patents[year] = set() # starting with an empty set per patent
-
-	# iterate through alias set finding patents
-	# for a in alias_set:
-	# 	# get set of patent_id for this assignee_alias
-	# 	a_id = assignee_name_id[a]
-	# 	p_id_set = assignee_patent_id_set[a_id]
-
-	# iterate through the patent_id set and get patent dates
-	for p_id in patent_list:
-		# TODO: HERE TO ACCESS MORE INFORMATION ABOUT THE PATENT
-		p_year = app_dict[p_id][:4]
-
-		# patent year may be too recent or too early (from incorrect matching)
-		# skip this patent_id if so
-		if int(p_year) > 2016 or int(p_year) < start_date:
-			continue
-
-		year_patents[int(p_year)].add(p_id) # add this patent id to the relevant bucket
-
-	# write the information into the output file
-	for year, patent_id_set in year_patents.items():
-		row = [ipo, year, len(patent_id_set), '; '.join(patent_id_set)]
-		fyp_2.writerow(row)
-
+buckets = bucket_patents(pair_firms, pair_patents, app_year[pair_patents], first_years,
+						 args.last_year)
 
+# write the information into the output file
+print('CREATING OUTPUT FILE\n')
+with open('outputs/firm_year_patentcnt_REVISED.csv', 'w', newline="\n", encoding='utf-8-sig') as output:
+	fyp_2 = csv.writer(output, delimiter=',')
+	header = ['ipo_firm', 'year', 'patent_cnt', 'patent_ids']
+	fyp_2.writerow(header)
+	fyp_2.writerows(buckets.rows(ipo_firms, patent_ids))
 
 
 # END OF PROCESS ##
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Application Number Index
+
+Resolves the application numbers of usapplicationcitation.tsv to the
+patents of application.tsv without a dict keyed by number string. A number
+is its number column without the 'yyyy/' prefix; a digit string of up to
+18 digits is stored as the int64 '1' + digits (the leading 1 keeps
+'0012' and '012' apart), in a sorted array with the patent code (or any
+int) of every number next to it:
+
+    from app_number_index import app_number_index
+    index = app_number_index([(application['number'], application_patent)])
+    index.resolve(usappcitation['number'])  # codes, MISSING if unknown
+
+A whole batch of numbers is resolved with one binary search
+(np.searchsorted). As in a dict filled in file order, the last row of a
+number wins. The few numbers that are not short digit strings are kept as
+strings in a second sorted array.
+
+Running this file compares the memory and speed of the dict the scripts
+used to build with the index, on application.tsv and
+usapplicationcitation.tsv or on random numbers:
+    python app_number_index.py
+    python app_number_index.py --random 10000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from id_codes import MISSING
+
+# digits that fit an int64 after the leading 1
+MAX_DIGITS = 18
+
+
+def suffixes(strings, start):
+    """string[start:] of every string of a numpy str array."""
+    strings = np.ascontiguousarray(strings, dtype=np.str_)
+    width = strings.dtype.itemsize // 4
+    if width <= start:
+        return np.full(len(strings), '', dtype='<U1')
+    # view every string as its characters and cut off the first ones
+    chars = strings.view('<U1').reshape(len(strings), width)
+    return np.ascontiguousarray(chars[:, start:]).view(
+            '<U' + str(width - start)).ravel()
+
+
+def number_keys(numbers, start=5):
+    """
+    (int64 key of every number[start:], whether it has one): '1' + the
+    digits, for digit strings of at most MAX_DIGITS digits.
+    """
+    numbers = np.ascontiguousarray(numbers, dtype=np.str_)
+    width = numbers.dtype.itemsize // 4
+    keys = np.ones(len(numbers), dtype=np.int64)
+    valid = np.ones(len(numbers), dtype=bool)
+    if width <= start:
+        return keys, valid
+    chars = numbers.view(np.uint32).reshape(len(numbers), width)[:, start:]
+    lengths = np.char.str_len(numbers) - start
+    valid &= lengths <= MAX_DIGITS
+    # one column at a time, to keep a single int64 column in memory
+    for k in range(chars.shape[1]):
+        inside = lengths > k
+        if not inside.any():
+            break
+        digit = chars[:, k].astype(np.int64) - ord('0')
+        valid &= ~inside | ((digit >= 0) & (digit <= 9))
+        keys = np.where(inside & valid, keys * 10 + digit, keys)
+    return keys, valid
+
+
+def last_of_runs(keys, values):
+    """(sorted distinct keys, value of the last occurrence of every key)"""
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    last = np.r_[keys[1:] != keys[:-1], True][:len(keys)]
+    return keys[last], values[last]
+
+
+def search(keys, values, queries, default):
+    """
+    The values of queries in sorted keys, default if not found. The
+    queries are searched in sorted order, so that the binary searches walk
+    the keys from start to end instead of jumping around in memory.
+    """
+    found = np.full(len(queries), default, dtype=values.dtype)
+    if not len(keys):
+        return found
+    order = np.argsort(queries)
+    queries = queries[order]
+    i = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+    hit = keys[i] == queries
+    found[order[hit]] = values[i[hit]]
+    return found
+
+
+def concatenated(arrays, dtype):
+    """The arrays joined, an empty dtype array if there are none."""
+    if not arrays:
+        return np.array([], dtype=dtype)
+    return np.concatenate(arrays)
+
+
+class AppNumberIndex:
+    """Sorted application numbers, with the value of every number."""
+
+    def __init__(self, keys, values, other_numbers, other_values):
+        # number_keys of the digit numbers, sorted
+        self.keys = keys
+        self.values = values
+        # the other numbers (without 'yyyy/'), sorted
+        self.other_numbers = other_numbers
+        self.other_values = other_values
+
+    def __len__(self):
+        return len(self.keys) + len(self.other_numbers)
+
+    @property
+    def nbytes(self):
+        return (self.keys.nbytes + self.values.nbytes +
+                self.other_numbers.nbytes + self.other_values.nbytes)
+
+    def resolve(self, numbers, default=MISSING, start=5):
+        """Values of application numbers (with 'yyyy/'), default if unknown."""
+        keys, valid = number_keys(numbers, start)
+        resolved = search(self.keys, self.values, keys, default)
+        if not valid.all():
+            others = suffixes(np.asarray(numbers, dtype=np.str_)[~valid],
+                              start)
+            resolved[~valid] = search(self.other_numbers, self.other_values,
+                                      others, default)
+        return resolved
+
+
+def app_number_index(batches, start=5):
+    """
+    The index of (numbers, values) batches of rows in file order, numbers
+    with 'yyyy/' (start=5) and values int arrays. Only the int64 keys,
+    the values and the numbers that are not digit strings are kept of
+    every batch.
+    """
+    keys, values, other_numbers, other_values = [], [], [], []
+    for numbers, batch_values in batches:
+        batch_values = np.asarray(batch_values)
+        batch_keys, valid = number_keys(numbers, start)
+        keys.append(batch_keys[valid])
+        values.append(batch_values[valid])
+        if not valid.all():
+            other_numbers.append(suffixes(
+                    np.asarray(numbers, dtype=np.str_)[~valid], start))
+            other_values.append(batch_values[~valid])
+
+    dtype = values[0].dtype if values else np.int32
+    return AppNumberIndex(
+            *last_of_runs(concatenated(keys, np.int64),
+                          concatenated(values, dtype)),
+            *last_of_runs(concatenated(other_numbers, np.str_),
+                          concatenated(other_values, dtype)))
+
+
+def dict_table(numbers, patents):
+    """
+    The dict of number[5:] to patent the scripts used to build (for the
+    benchmark).
+    """
+    app_to_patent = {}
+    for number, patent in zip(numbers, patents):
+        app_to_patent[number[5:]] = patent
+    return app_to_patent
+
+
+def random_numbers(count, rng):
+    """count random 'yyyy/nnnnnnnnnnn' application numbers."""
+    years = rng.integers(1976, 2021, count)
+    serials = rng.integers(0, 10**11, count)
+    return np.char.add(np.char.add(years.astype(np.str_), '/'),
+                       np.char.zfill(serials.astype(np.str_), 11))
+
+
+def measure(run):
+    """(result, seconds, peak MB allocated in this process) of run()"""
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Memory and speed of a dict of application numbers '
+                        'and of the sorted index.')
+    parser.add_argument('--random', type=int, metavar='N',
+                        help='N random applications and N citations instead '
+                             'of the TSVs')
+    args = parser.parse_args()
+
+    if args.random:
+        rng = np.random.default_rng(0)
+        numbers = random_numbers(args.random, rng)
+        patents = rng.permutation(args.random).astype(np.int32)
+        # half of the citations are of known applications
+        cited = np.where(rng.random(args.random) < 0.5,
+                         numbers[rng.integers(0, args.random, args.random)],
+                         random_numbers(args.random, rng))
+    else:
+        from id_codes import load_codes
+        from tsv_cache import load_columns
+        numbers = load_columns('../patent_data/application.tsv',
+                               ['number'])['number']
+        patents = load_codes('../patent_data/application.tsv', 'patent_id')
+        cited = load_columns('../patent_data/usapplicationcitation.tsv',
+                             ['number'])['number']
+    print('{} applications, {} citations'.format(len(numbers), len(cited)))
+
+    number_list, patent_list = numbers.tolist(), patents.tolist()
+    cited_list = cited.tolist()
+    app_to_patent, seconds, peak = measure(
+            lambda: dict_table(number_list, patent_list))
+    print('  {:<16}{:8.2f} s {:8.1f} MB'.format('dict', seconds, peak))
+    index, seconds, peak = measure(
+            lambda: app_number_index([(numbers, patents)]))
+    print('  {:<16}{:8.2f} s {:8.1f} MB peak, {:.1f} MB kept'.format(
+            'index', seconds, peak, index.nbytes / 2**20))
+
+    expected, seconds, _ = measure(
+            lambda: [app_to_patent.get(number[5:], MISSING)
+                     for number in cited_list])
+    print('  {:<16}{:8.2f} s {:8.1f} M citations/s'.format(
+            'dict lookups', seconds, len(cited) / seconds / 1e6))
+    resolved, seconds, _ = measure(lambda: index.resolve(cited))
+    print('  {:<16}{:8.2f} s {:8.1f} M citations/s'.format(
+            'index.resolve', seconds, len(cited) / seconds / 1e6))
+
+    if resolved.tolist() != expected:
+        raise AssertionError('the index and the dict resolve differently')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Citation Graph
+
+The patent citations of uspatentcitation.tsv and usapplicationcitation.tsv
+as a compressed sparse row (CSR) graph over the patent codes of id_codes.py:
+for every patent, offsets[code]:offsets[code + 1] is the slice of an int32
+neighbor array holding the patents it cites (backward) or the patents that
+cite it (forward).
+
+    from citation_graph import load_graph
+    graph = load_graph()
+    graph.backward(code)                # codes of the patents it cites
+    graph.forward(code, 7)              # codes of the patents citing it
+                                        # within 7 application years
+
+backward has every row of uspatentcitation, in file order. forward has the
+dated rows of uspatentcitation followed by the dated rows of
+usapplicationcitation whose application is in application.tsv, each in
+file order. graph.year is the application year of every patent code (see
+date_table.py). The year lag of a forward citation is
+    app year of the citing patent (20000 if unknown) -
+    app year of the cited patent (missing_year if unknown)
+
+The graph is built once into ../patent_data/.cache/citation_graph/ and
+memory-mapped afterwards. It is rebuilt when a source TSV or the patent
+codes change. Running this file builds it and prints its size:
+    python citation_graph.py
+
+The arrays are filled in one pass after counting the citations of every
+patent, the neighbors are put in order with a counting sort (see
+counting_sort). Application numbers are resolved to patents with the
+sorted index of app_number_index.py. To time this against the
+dict of lists the scripts used to build:
+    python citation_graph.py --benchmark
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from app_number_index import app_number_index
+from date_table import DATES_DIR, DateTable, load_dates
+from id_codes import IDS_DIR, MISSING, load_codes, load_ids, take
+from tsv_cache import load_columns, source_stamp, temp_path, write_array
+
+GRAPH_DIR = '../patent_data/.cache/citation_graph'
+
+SOURCES = [
+    '../patent_data/application.tsv',
+    '../patent_data/uspatentcitation.tsv',
+    '../patent_data/usapplicationcitation.tsv',
+    os.path.join(IDS_DIR, 'patent.npy'),
+]
+
+# application year of a patent with no application.tsv row
+NO_YEAR = 20000
+
+ARRAYS = ['backward_offsets', 'backward_neighbors',
+          'forward_offsets', 'forward_neighbors']
+
+
+class CitationGraph:
+    """Memory-mapped backward and forward citations of every patent code."""
+
+    def __init__(self, directory=GRAPH_DIR, dates_directory=DATES_DIR):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'),
+                                        mmap_mode='r'))
+        # application year of every patent code
+        self.year = DateTable(dates_directory).app_year
+
+    def backward(self, patent):
+        """Codes of the patents cited by a patent."""
+        if patent == MISSING:
+            return self.backward_neighbors[:0]
+        return self.backward_neighbors[
+            self.backward_offsets[patent]:self.backward_offsets[patent + 1]]
+
+    def forward(self, patent, max_lag=None, missing_year=0):
+        """
+        Codes of the patents citing a patent, only those at most max_lag
+        application years after it if max_lag is given.
+        """
+        if patent == MISSING:
+            return self.forward_neighbors[:0]
+        citing = self.forward_neighbors[
+            self.forward_offsets[patent]:self.forward_offsets[patent + 1]]
+        if max_lag is None or not len(citing):
+            return citing
+        year = self.year[patent]
+        if year == MISSING:
+            year = missing_year
+        return citing[take(self.year, citing, NO_YEAR) - year <= max_lag]
+
+
+def ranges(starts, counts):
+    """
+    (owner, position) of the elements of the ranges starts[i]:starts[i] +
+    counts[i], concatenated in order: owner is the i of every element.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    positions = (np.repeat(np.asarray(starts, dtype=np.int64) - first, counts) +
+                 np.arange(len(owners)))
+    return owners, positions
+
+
+def slices(offsets, keys):
+    """
+    ranges() of the offsets[key]:offsets[key + 1] slices of every key (none
+    for MISSING), e.g. the forward neighbors of many patents at once:
+        owners, positions = slices(graph.forward_offsets, patents)
+        graph.forward_neighbors[positions]
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    found = keys != MISSING
+    starts = np.zeros(len(keys), dtype=np.int64)
+    counts = np.zeros(len(keys), dtype=np.int64)
+    starts[found] = offsets[keys[found]]
+    counts[found] = offsets[keys[found] + 1] - starts[found]
+    return ranges(starts, counts)
+
+
+def counting_sort(keys, size):
+    """
+    Stable order of int keys in [0, size): a counting sort on the low 16
+    bits of the keys, then one on the high 16 bits (numpy sorts 16-bit
+    keys with a radix sort), instead of an O(n log n) comparison sort.
+    """
+    if size > 1 << 32:
+        raise ValueError('keys do not fit 32 bits')
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort((keys & 0xFFFF).astype(np.uint16), kind='stable')
+    if size > 1 << 16:
+        high = (keys[order] >> 16).astype(np.uint16)
+        order = order[np.argsort(high, kind='stable')]
+    return order
+
+
+def build_csr(keys, neighbors, size):
+    """
+    (offsets, neighbors grouped by key): the keys are counted first, the
+    grouped array is allocated once and filled in counting sort order,
+    keeping the order of the neighbors of every key.
+    """
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    grouped = np.empty(len(keys), dtype=np.int32)
+    np.take(neighbors, counting_sort(keys, size), out=grouped)
+    return offsets, grouped
+
+
+def graph_arrays():
+    """Builds the graph arrays from the citation TSVs."""
+    size = len(load_ids('patent'))
+
+    application = load_columns('../patent_data/application.tsv', ['number'])
+    application_patent = load_codes('../patent_data/application.tsv',
+                                    'patent_id')
+    app_to_patent = app_number_index([(application['number'],
+                                       application_patent)])
+
+    citing = load_codes('../patent_data/uspatentcitation.tsv', 'patent_id')
+    cited = load_codes('../patent_data/uspatentcitation.tsv', 'citation_id')
+    dated = load_columns('../patent_data/uspatentcitation.tsv',
+                         ['date'])['date'] != ''
+
+    usappcitation = load_columns('../patent_data/usapplicationcitation.tsv',
+                                 ['date', 'number'])
+    app_citing = load_codes('../patent_data/usapplicationcitation.tsv',
+                            'patent_id')
+    app_cited = app_to_patent.resolve(usappcitation['number'])
+    app_dated = usappcitation['date'] != ''
+
+    arrays = {}
+    keep = (citing != MISSING) & (cited != MISSING)
+    arrays['backward_offsets'], arrays['backward_neighbors'] = build_csr(
+            citing[keep], cited[keep], size)
+
+    forward_cited = np.concatenate([cited[dated], app_cited[app_dated]])
+    forward_citing = np.concatenate([citing[dated], app_citing[app_dated]])
+    keep = (forward_cited != MISSING) & (forward_citing != MISSING)
+    arrays['forward_offsets'], arrays['forward_neighbors'] = build_csr(
+            forward_cited[keep], forward_citing[keep], size)
+    return arrays
+
+
+def build_graph(directory):
+    """Builds the CSR arrays from the citation TSVs."""
+    print('Building citation graph\n...')
+    for name, array in graph_arrays().items():
+        write_array(directory, name, array)
+
+
+def dict_graph():
+    """
+    The forward and backward citations as dicts of lists of patent ids,
+    built row by row as the scripts did before the graph (for the
+    benchmark).
+    """
+    application = load_columns('../patent_data/application.tsv',
+                               ['patent_id', 'number'])
+    app_to_patent = {}
+    for patent, number in zip(application['patent_id'].tolist(),
+                              application['number'].tolist()):
+        app_to_patent[number[5:]] = patent
+
+    uspatentcitation = load_columns('../patent_data/uspatentcitation.tsv',
+                                    ['patent_id', 'citation_id', 'date'])
+    patent_to_citationbk = {}
+    patent_to_citationfw = {}
+    for patent, cit, date in zip(uspatentcitation['patent_id'].tolist(),
+                                 uspatentcitation['citation_id'].tolist(),
+                                 uspatentcitation['date'].tolist()):
+        lst = patent_to_citationbk.get(patent, [])
+        lst.append(cit)
+        patent_to_citationbk[patent] = lst
+        if date:
+            lst = patent_to_citationfw.get(cit, [])
+            lst.append(patent)
+            patent_to_citationfw[cit] = lst
+
+    usappcitation = load_columns('../patent_data/usapplicationcitation.tsv',
+                                 ['patent_id', 'date', 'number'])
+    for patent, date, number in zip(usappcitation['patent_id'].tolist(),
+                                    usappcitation['date'].tolist(),
+                                    usappcitation['number'].tolist()):
+        cit = app_to_patent.get(number[5:])
+        if date and cit:
+            lst = patent_to_citationfw.get(cit, [])
+            lst.append(patent)
+            patent_to_citationfw[cit] = lst
+    return patent_to_citationbk, patent_to_citationfw
+
+
+def load_graph(directory=GRAPH_DIR):
+    """Returns the citation graph, (re)building it if it is out of date."""
+    load_ids('patent')
+    load_dates()
+    stamp = {path: source_stamp(path) for path in SOURCES}
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        build_graph(directory)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+
+    return CitationGraph(directory)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--benchmark']:
+        # time both builds from the cached columns, not the TSV parsing
+        graph_arrays()
+        for name, build in [('dict of lists', dict_graph),
+                            ('counting sort', graph_arrays)]:
+            start = time.perf_counter()
+            build()
+            print('{:<16}{:8.2f} s'.format(name, time.perf_counter() - start))
+    else:
+        graph = load_graph()
+        print('patents:            ' + str(len(graph.year)))
+        print('backward citations: ' + str(len(graph.backward_neighbors)))
+        print('forward citations:  ' + str(len(graph.forward_neighbors)))
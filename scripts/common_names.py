@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Common IPO Name Lookup
+
+Answers the is_common flag of name_matches.csv: 1 if the normalized IPO firm
+name is a common English phrase (wordfreq frequency >= 0.000001), else 0.
+
+The flags are cached per normalized IPO name in memory and in the on-disk
+table outputs/ipo_is_common.csv (header: modified_ipo_firm, is_common), which
+precompute() fills from the IPO list. Once every IPO name is in the table,
+matching runs never import wordfreq.
+
+Running this file (re)builds the table from ipo_10000.csv:
+    python common_names.py [ipo_file]
+"""
+
+import csv
+import os.path
+import sys
+from functools import lru_cache
+
+from name_normalizer import normalize_name
+from tsv_reader import read_rows
+
+TABLE_PATH = '../outputs/ipo_is_common.csv'
+
+# normalized IPO name -> is_common, as read from / written to the table
+table = {}
+
+
+def word_is_common(name):
+    """Looks the name up in wordfreq (imported only when needed)."""
+    from wordfreq import word_frequency
+    if word_frequency(name, 'en') < 0.000001:
+        return 0
+    return 1
+
+
+@lru_cache(maxsize=65536)
+def is_common(name):
+    """Returns the is_common flag (0 or 1) of a normalized IPO name."""
+    if name in table:
+        return table[name]
+    return word_is_common(name)
+
+
+def load_table(path=TABLE_PATH):
+    """Reads the on-disk table into memory, if there is one."""
+    if not os.path.isfile(path):
+        return
+    for name, is_common in read_rows(path, {'modified_ipo_firm': 'str',
+                                            'is_common': 'int'},
+                                     delimiter=','):
+        table[name] = is_common
+
+
+def precompute(names, path=TABLE_PATH):
+    """
+    Makes sure every normalized IPO name is in the table, computing the
+    missing ones with wordfreq and saving the table if any were added.
+    Returns the number of names added.
+    """
+    load_table(path)
+    missing = set(names).difference(table)
+    if not missing:
+        return 0
+
+    for name in missing:
+        table[name] = word_is_common(name)
+    is_common.cache_clear()
+
+    with open(path, 'w', newline="\n", encoding='utf-8-sig') as table_file:
+        output = csv.writer(table_file, delimiter=',')
+        output.writerow(['modified_ipo_firm', 'is_common'])
+        for name in sorted(table):
+            output.writerow([name, table[name]])
+    return len(missing)
+
+
+if __name__ == '__main__':
+    ipo_path = sys.argv[1] if len(sys.argv) > 1 else '../firms/ipo_10000.csv'
+    names = [normalize_name(firm.strip())
+             for firm, in read_rows(ipo_path, ['firm'], delimiter=',')]
+    print('added ' + str(precompute(names)) + ' names to ' + TABLE_PATH)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPC Index
+
+The rows of cpc_current.tsv grouped by patent code (see id_codes.py), with
+the subsection, group and sequence of every row as small int codes into
+their sorted distinct values, instead of a list of strings per row:
+
+    from cpc_index import load_cpc
+    cpc = load_cpc()
+    cpc.entries(code)               # [(subsection_id, group_id, sequence)]
+    cpc.primary_subsection(code)    # subsection_id of its sequence 0 row
+    cpc.counts('0')                 # sequence 0 rows of every patent code
+    cpc.subsections[cpc.rows(code)] # subsection codes of its rows
+
+Per row (grouped by patent, each patent's rows in file order):
+    subsections - uint16 code into subsection_ids
+    groups      - uint32 code into group_ids
+    sequences   - uint16 code into sequence_ids
+Patent code k's rows are offsets[k]:offsets[k + 1]. primary holds the
+subsection code of the last sequence 0 row of every patent (MISSING if it
+has none), like a dict filled with the sequence 0 rows in file order.
+
+The index is built once into ../patent_data/.cache/cpc_index/ and
+memory-mapped afterwards. It is rebuilt when cpc_current.tsv or the patent
+codes change. Running this file builds it and prints its size:
+    python cpc_index.py
+"""
+
+import json
+import os
+
+import numpy as np
+
+from id_codes import IDS_DIR, MISSING, load_codes, load_ids
+from tsv_cache import load_columns, source_stamp, temp_path, write_array
+
+CPC_DIR = '../patent_data/.cache/cpc_index'
+
+SOURCES = [
+    '../patent_data/cpc_current.tsv',
+    os.path.join(IDS_DIR, 'patent.npy'),
+]
+
+ARRAYS = ['offsets', 'subsections', 'groups', 'sequences', 'primary',
+          'subsection_ids', 'group_ids', 'sequence_ids']
+
+
+class CpcIndex:
+    """Memory-mapped cpc_current rows, grouped by patent code."""
+
+    def __init__(self, directory=CPC_DIR):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'),
+                                        mmap_mode='r'))
+        # the distinct values are few, keep them as python strings
+        self.subsection_ids = self.subsection_ids.tolist()
+        self.group_ids = self.group_ids.tolist()
+        self.sequence_ids = self.sequence_ids.tolist()
+
+    def rows(self, patent):
+        """Slice of the rows of a patent code."""
+        if patent == MISSING:
+            return slice(0, 0)
+        return slice(int(self.offsets[patent]), int(self.offsets[patent + 1]))
+
+    def entries(self, patent):
+        """(subsection_id, group_id, sequence) of every row of a patent code."""
+        rows = self.rows(patent)
+        return [(self.subsection_ids[subsection], self.group_ids[group],
+                 self.sequence_ids[sequence])
+                for subsection, group, sequence in zip(
+                        self.subsections[rows].tolist(),
+                        self.groups[rows].tolist(),
+                        self.sequences[rows].tolist())]
+
+    def counts(self, sequence=None):
+        """
+        Number of rows of every patent code, only counting the rows with the
+        given sequence if there is one.
+        """
+        if sequence is None:
+            return np.diff(self.offsets)
+        if sequence not in self.sequence_ids:
+            return np.zeros(len(self.offsets) - 1, dtype=np.int64)
+        matches = np.zeros(len(self.sequences) + 1, dtype=np.int64)
+        np.cumsum(self.sequences == self.sequence_ids.index(sequence),
+                  out=matches[1:])
+        return matches[self.offsets[1:]] - matches[self.offsets[:-1]]
+
+    def primary_subsection(self, patent, default=None):
+        """subsection_id of the sequence 0 row of a patent code."""
+        if patent == MISSING or self.primary[patent] == MISSING:
+            return default
+        return self.subsection_ids[self.primary[patent]]
+
+
+def categories(values, dtype):
+    """(sorted distinct values, code of every value as dtype)"""
+    ids, codes = np.unique(np.asarray(values), return_inverse=True)
+    if len(ids) > np.iinfo(dtype).max + 1:
+        raise ValueError(str(len(ids)) + ' distinct values do not fit ' +
+                         np.dtype(dtype).name + ' codes')
+    return ids, codes.astype(dtype)
+
+
+def build_index(directory):
+    """Builds the index arrays from cpc_current.tsv."""
+    print('Building CPC index\n...')
+    size = len(load_ids('patent'))
+
+    cpc_current = load_columns('../patent_data/cpc_current.tsv',
+                               ['subsection_id', 'group_id', 'sequence'])
+    patents = load_codes('../patent_data/cpc_current.tsv', 'patent_id')
+    keep = patents != MISSING
+    patents = patents[keep]
+
+    subsection_ids, subsections = categories(
+            cpc_current['subsection_id'][keep], np.uint16)
+    group_ids, groups = categories(cpc_current['group_id'][keep], np.uint32)
+    sequence_ids, sequences = categories(cpc_current['sequence'][keep],
+                                         np.uint16)
+
+    order = np.argsort(patents, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(patents, minlength=size), out=offsets[1:])
+
+    # subsection of the last sequence 0 row of every patent: the first one
+    # of the reversed rows
+    primary = np.full(size, MISSING, dtype=np.int32)
+    if '0' in sequence_ids.tolist():
+        rows = np.flatnonzero(
+                sequences == sequence_ids.tolist().index('0'))[::-1]
+        primary_patents, first = np.unique(patents[rows], return_index=True)
+        primary[primary_patents] = subsections[rows[first]]
+
+    write_array(directory, 'offsets', offsets)
+    write_array(directory, 'subsections', subsections[order])
+    write_array(directory, 'groups', groups[order])
+    write_array(directory, 'sequences', sequences[order])
+    write_array(directory, 'primary', primary)
+    write_array(directory, 'subsection_ids', subsection_ids)
+    write_array(directory, 'group_ids', group_ids)
+    write_array(directory, 'sequence_ids', sequence_ids)
+
+
+def load_cpc(directory=CPC_DIR):
+    """Returns the CPC index, (re)building it if it is out of date."""
+    load_ids('patent')
+    stamp = {path: source_stamp(path) for path in SOURCES}
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        build_index(directory)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+
+    return CpcIndex(directory)
+
+
+if __name__ == '__main__':
+    cpc = load_cpc()
+    print('patents:     ' + str(len(cpc.offsets) - 1))
+    print('cpc rows:    ' + str(len(cpc.subsections)))
+    print('subsections: ' + str(len(cpc.subsection_ids)))
+    print('groups:      ' + str(len(cpc.group_ids)))
+    print('bytes:       ' + str(sum(getattr(cpc, name).nbytes for name in
+                                    ['offsets', 'subsections', 'groups',
+                                     'sequences', 'primary'])))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patent Date Table
+
+The application and grant dates of every patent code (see id_codes.py) as
+int32 arrays indexed by code, instead of a dict keyed by patent ID in every
+script:
+
+    from date_table import load_dates
+    dates = load_dates()
+    get(dates.app_year, code, 'N/A')    # application year (application.tsv)
+    get(dates.grant_year, code, 'N/A')  # grant year (patent.tsv)
+    dates.app_date[code]                # application date as yyyymmdd
+
+Entries without a date are MISSING; like a dict, the last row of a patent
+wins.
+
+The table is built once into ../patent_data/.cache/date_table/ and
+memory-mapped afterwards, so processes running at the same time share one
+copy through the page cache. It is rebuilt when application.tsv, patent.tsv
+or the patent codes change. Running this file builds it and prints its size:
+    python date_table.py
+"""
+
+import json
+import os
+
+import numpy as np
+
+from id_codes import IDS_DIR, MISSING, load_codes, load_ids, lookup_table
+from tsv_cache import load_columns, source_stamp, temp_path, write_array
+
+DATES_DIR = '../patent_data/.cache/date_table'
+
+SOURCES = [
+    '../patent_data/application.tsv',
+    '../patent_data/patent.tsv',
+    os.path.join(IDS_DIR, 'patent.npy'),
+]
+
+ARRAYS = ['app_year', 'grant_year', 'app_date']
+
+
+class DateTable:
+    """Memory-mapped dates of every patent code."""
+
+    def __init__(self, directory=DATES_DIR):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'),
+                                        mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.app_year)
+
+
+def build_dates(directory):
+    """Builds the date arrays from application.tsv and patent.tsv."""
+    print('Building date table\n...')
+    application = load_columns('../patent_data/application.tsv',
+                               {'date': 'year'})
+    application_dates = load_columns('../patent_data/application.tsv',
+                                     {'date': 'date'})
+    application_patent = load_codes('../patent_data/application.tsv',
+                                    'patent_id')
+    patent = load_columns('../patent_data/patent.tsv', {'date': 'year'})
+
+    write_array(directory, 'app_year', lookup_table(
+            'patent', application_patent, application['date']))
+    write_array(directory, 'grant_year', lookup_table(
+            'patent', load_codes('../patent_data/patent.tsv', 'number'),
+            patent['date']))
+    write_array(directory, 'app_date', lookup_table(
+            'patent', application_patent, application_dates['date']))
+
+
+def load_dates(directory=DATES_DIR):
+    """Returns the date table, (re)building it if it is out of date."""
+    load_ids('patent')
+    stamp = {path: source_stamp(path) for path in SOURCES}
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        build_dates(directory)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+
+    return DateTable(directory)
+
+
+if __name__ == '__main__':
+    dates = load_dates()
+    print('patents:          ' + str(len(dates)))
+    print('with app year:    ' + str(int(np.sum(dates.app_year != MISSING))))
+    print('with grant year:  ' + str(int(np.sum(dates.grant_year != MISSING))))
+    print('bytes:            ' + str(sum(getattr(dates, name).nbytes
+                                         for name in ARRAYS)))
@@ -1,117 +1,110 @@
- #!/usr/bin/env python3
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
 Firm Foward Citation Count
 
-This script counts the forward citations per patent for 4 different year 
-ranges. The year ranges are 4, 5, and 7 years after the publication year 
-of the patent.
+This script counts the forward citations of each firm-year's patents for
+different year ranges. The year ranges are 4, 5, and 7 years after the
+publication year of the patent by default. The citations are the forward
+citations of firm_year_patents, taken straight from the citation graph and
+counted with forward_citations.py.
 
 Ths file produced is outputs/firm_forward_citation_cnt.csv, which has the header:
     ipo_firm, year, forward_cnt4, forward_cnt5, forward_cnt7.
 
+Usage: python firm_forward_citation_cnt.py [--windows 4 5 7 ...]
+
 @author: Audrey Yang (auyang@seas.upenn.edu)
 """
 
+import argparse
 import time
 import csv
+import numpy as np
+from tsv_reader import read_rows
+from citation_graph import load_graph
+from cpc_index import load_cpc
+from id_codes import encode, load_ids
+from forward_citations import WINDOWS, window_counts, window_header, window_row
+
+this_year = 2020
 
-print('***\nBEGIN PROCESS')
-start_time = time.ctime()
+# Year range of the forward citations in firm_year_patents
+year_range = 7
 
-# Load in firm_year_patentcnt.csv
-firm_year_patent_file = open('../outputs/firm_year_patentcnt_REVISED.csv', 
-                             encoding='utf-8-sig')
-firm_year_patents = csv.DictReader(firm_year_patent_file, delimiter=',')
 
-# Load in firm_year_patents.csv
-citations_file = open('../outputs/firm_year_patents.csv', 
-                      encoding='utf-8-sig')
-citations = csv.DictReader(citations_file, delimiter=',')
+def main():
+    parser = argparse.ArgumentParser(
+            description='Forward citation counts per firm and year.')
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS,
+                        help='year ranges to count (default 4 5 7)')
+    args = parser.parse_args()
+    windows = sorted(args.windows)
+
+    print('***\nBEGIN PROCESS')
+    start_time = time.ctime()
+
+    # Load the citation graph (built once, then memory-mapped)
+    patents = load_ids('patent')
+    graph = load_graph()
+
+    # Load the cpc rows of every patent (built once, then memory-mapped)
+    cpc = load_cpc()
+
+    # A forward citation is counted once per sequence 0 cpc row of the
+    # citing patent (once if it has no cpc rows, once per cpc row for
+    # design patents), like its rows in firm_year_patents
+    print('Creating citation weights\n...')
+    patent_to_cpc_cnt = cpc.counts().tolist()
+    patent_to_seq0_cnt = cpc.counts('0').tolist()
+
+    def weight(cit):
+        if not patent_to_cpc_cnt[cit]:
+            return 1
+        if patents[cit][0] == 'D':
+            return patent_to_cpc_cnt[cit]
+        return patent_to_seq0_cnt[cit]
+
+    # Load in firm_year_patentcnt.csv
+    firm_year_patents = list(read_rows(
+            '../outputs/firm_year_patentcnt_REVISED.csv',
+            {'ipo_firm': 'str', 'year': 'int', 'patent_cnt': 'int',
+             'patent_ids': 'str'}, delimiter=','))
+
+    # Forward citations of every firm-year: (firm, year), lag, weight
+    print('Counting forward citations\n...')
+    keys, lags, weights = [], [], []
+    for firm, year, patent_cnt, patent_ids in firm_year_patents:
+        if patent_cnt > 0:
+            key = (firm, year)
+            for code in encode('patent', patent_ids.split('; ')).tolist():
+                cits = graph.forward(code, max(year_range, windows[-1]))
+                keys += [key] * len(cits)
+                lags += (graph.year[cits] - key[1]).tolist()
+                weights += [weight(cit) for cit in cits.tolist()]
+    counts = window_counts(keys, lags, windows,
+                           np.array(weights, dtype=np.float64))
+
+    # Create output file
+    print('WRITING TO FILE\n...')
+    with open('../outputs/firm_forward_citation_cnt.csv', 'w',
+              newline='\n', encoding='utf-8-sig') as output_file:
+        output = csv.writer(output_file, delimiter=',')
+        header = ['ipo_firm', 'year'] + window_header(windows)
+        output.writerow(header)
+
+        no_counts = [0] * len(windows)
+        for firm, curr_year, patent_cnt, patent_ids in firm_year_patents:
+            output.writerow([firm, curr_year] + window_row(
+                    counts.get((firm, curr_year), no_counts), curr_year,
+                    this_year, windows))
+
+    print('***\nEND OF PROCESS')
+    end_time = time.ctime()
+
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
 
-this_year = 2020
 
-# Create output file
-print('WRITING TO FILE\n...')
-with open('../outputs/firm_forward_citation_cnt.csv', 'w', 
-          newline='\n', encoding='utf-8-sig') as output_file:
-    output = csv.writer(output_file, delimiter=',')
-    header = ['ipo_firm', 'year', 'forward_cnt4', 'forward_cnt5', 
-              'forward_cnt7']
-    output.writerow(header)
-    
-    # Keep track of current state 
-    nxt = next(citations)
-    count4, count5, count7 = 0, 0, 0
-    
-    # Iterate through firm_year_patentcnt
-    for row in firm_year_patents:
-        count4, count5, count7 = 0, 0, 0
-        firm = row['ipo_firm']
-        curr_year = int(row['year'])
-        if row['patent_cnt'] == '0' and curr_year < this_year - 7:
-            output.writerow([
-                    firm, 
-                    curr_year, 
-                    0,
-                    0,
-                    0
-                ])
-            continue
-        
-        while int(nxt['date_patent']) == curr_year:
-            # Counting forward citations
-            if nxt['citation_type'] == '1':
-                if nxt['sequence'] == '0' or nxt['sequence'] == 'N/A':    
-                    cit_year = int(nxt['date_citation'])
-                    if cit_year - curr_year <= 4:
-                        count4 += 1
-                    if cit_year - curr_year <= 5:
-                        count5 += 1
-                    if cit_year - curr_year <= 7:
-                        count7 += 1   
-            
-            # Stop if we reach the end of the citations file
-            try:
-                nxt = next(citations)
-            except StopIteration:
-                break
-        
-        if curr_year > this_year - 4: 
-            output.writerow([
-                    firm, 
-                    curr_year, 
-                    'N/A',
-                    'N/A',
-                    'N/A'
-                ])
-        elif curr_year > this_year - 5: 
-            output.writerow([
-                    firm, 
-                    curr_year, 
-                    count4,
-                    'N/A',
-                    'N/A'
-                ])
-        elif curr_year > this_year - 7:
-            output.writerow([
-                    firm, 
-                    curr_year, 
-                    count4, 
-                    count5,
-                    'N/A'
-                ])
-        else:
-            output.writerow([
-                    firm, 
-                    curr_year, 
-                    count4, 
-                    count5,
-                    count7
-                ])
-
-print('***\nEND OF PROCESS')
-end_time = time.ctime()
-
-print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
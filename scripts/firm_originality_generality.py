@@ -3,140 +3,157 @@
 """
 Patent Originality and Generality By Firm
 
-This script uses firm_year_patents to get the the number of citations
-per subsection. It then generates the Herfindahl measures for originality and
-generality (4, 5, and 7 years) for each patent.
+This script counts the citations per subsection of each patent in
+firm_year_patentcnt, straight from the citation graph and the CPC index
+(the same citations firm_year_patents lists). It then generates the
+Herfindahl measures for originality and generality (4, 5, and 7 years) for
+each patent (see originality_generality.py).
 
 The file produced is outputs/firm_originality_generality.csv, with header:
-    ipo_firm, year, patent_id, originality, generality4, 
+    ipo_firm, year, patent_id, originality, generality4,
     generality5, generality7.
 
-*Note: only sequence 0 subsections are counted and N/A subsections are ignored 
+*Note: only sequence 0 subsections are counted and N/A subsections are ignored
 
 @author: Audrey Yang (auyang@seas.upenn.edu)
 """
 
 import time
 import csv
-from collections import Counter
+import numpy as np
+from tsv_reader import read_rows
+from citation_graph import NO_YEAR, load_graph, ranges, slices
+from cpc_index import load_cpc
+from id_codes import encode, load_ids, take
+from originality_generality import (BACKWARD, NO_MEASURES, lag_buckets,
+                                    measures)
 
 print('***\nBEGIN PROCESS')
 start_time = time.ctime()
 
-# Load citations_forward_backward
-citations_file = open('../outputs/firm_year_patents.csv', 
-                            encoding='utf-8-sig')
-citations = csv.DictReader(citations_file, delimiter=',')
-
-print('Creating originality and generality dicts\n...')
-originality = {}
-generality4 = {} # contains data for patents <= 4 years into the future
-generality5 = {} # contains data for patents 5 years into the future
-generality7 = {} # contains data for patents 6 and 7 years into the future
-
-for row in citations:
-    # Only processing citations where sequence is 0 and has subsection_id
-    if row['sequence'] == '0' and not row['subsection_id'] == 'N/A':
-        # Backward citations -> originality
-        if row['citation_type'] == '0':
-            # Track subsection_id -> freq
-            c = originality.get(row['patent_id'], {})
-            c[row['subsection_id']] = c.get(row['subsection_id'], 0) + 1
-            originality[row['patent_id']] = c
-        # Forward citations -> generality
-        elif row['citation_type'] == '1':
-             # Track subsection_id -> freq
-            diff = int(row['date_citation']) - int(row['date_patent'])
-            if diff <= 4:
-                c = generality4.get(row['patent_id'], {})
-                c[row['subsection_id']] = c.get(row['subsection_id'], 0) + 1
-                generality4[row['patent_id']] = c
-            elif diff <= 5:
-                c = generality5.get(row['patent_id'], {})
-                c[row['subsection_id']] = c.get(row['subsection_id'], 0) + 1
-                generality5[row['patent_id']] = c
-            elif diff <= 7:
-                c = generality7.get(row['patent_id'], {})
-                c[row['subsection_id']] = c.get(row['subsection_id'], 0) + 1
-                generality7[row['patent_id']] = c
-                
+# Year range (for forward citations, as in firm_year_patents)
+year_range = 7
+
+# Load the CPC index (built once, then memory-mapped, see cpc_index.py)
+cpc = load_cpc()
+patent_to_cpc_cnt = cpc.counts()
+
+# The counted cpc rows: sequence 0 and not an N/A subsection, grouped by
+# patent like the index rows. Subsections are numbered by their cpc index
+# code + 1, 'Design' is 0
+print('Creating subsection tables\n...')
+counted = np.zeros(len(cpc.subsections), dtype=bool)
+if '0' in cpc.sequence_ids:
+    counted = np.asarray(cpc.sequences) == cpc.sequence_ids.index('0')
+if 'N/A' in cpc.subsection_ids:
+    counted &= np.asarray(cpc.subsections) != cpc.subsection_ids.index('N/A')
+counted_subsections = np.asarray(cpc.subsections)[counted].astype(np.int64) + 1
+counted_offsets = np.zeros(len(counted) + 1, dtype=np.int64)
+np.cumsum(counted, out=counted_offsets[1:])
+counted_offsets = counted_offsets[cpc.offsets]
+
+# Load the citation graph (built once, then memory-mapped)
+patents = load_ids('patent')
+graph = load_graph()
+
 # Load Kenneth table
-firm_year_patentcnt_file = open('../outputs/firm_year_patentcnt_REVISED.csv', 
-                            encoding='utf-8-sig')
-firm_year_patentcnt = csv.DictReader(firm_year_patentcnt_file, delimiter=',')
-  
-# Creating output file     
-with open('../outputs/firm_originality_generality.csv', 'w', 
+firm_year_patentcnt = list(read_rows(
+        '../outputs/firm_year_patentcnt_REVISED.csv',
+        ['ipo_firm', 'year', 'patent_cnt', 'patent_ids'], delimiter=','))
+
+
+def subsections(cits):
+    """
+    (index into cits, subsection code) of the counted subsections of every
+    cited/citing patent code, in order.
+    """
+    # Design patents have one 'Design' subsection per cpc row (at least one)
+    design = np.char.startswith(patents[cits], 'D')
+    starts = counted_offsets[cits]
+    counts = np.where(design, np.maximum(patent_to_cpc_cnt[cits], 1),
+                      counted_offsets[cits + 1] - starts)
+    owners, positions = ranges(starts, counts)
+    codes = np.zeros(len(owners), dtype=np.int64)
+    listed = ~design[owners]
+    codes[listed] = counted_subsections[positions[listed]]
+    return owners, codes
+
+
+def citations():
+    """
+    patent code, subsection code and bucket arrays of every citation in
+    firm_year_patents, in the order of the patents in firm_year_patentcnt,
+    the backward citations of a patent before its forward ones.
+    """
+    patent_ids = []
+    years = []
+    for firm, year, patent_cnt, ids in firm_year_patentcnt:
+        if int(patent_cnt) > 0:
+            ids = ids.split('; ')
+            patent_ids += ids
+            years += [int(year)] * len(ids)
+    codes = encode('patent', patent_ids).astype(np.int64)
+    years = np.array(years, dtype=np.int64)
+
+    # Backward citations -> originality
+    backward, positions = slices(graph.backward_offsets, codes)
+    backward_cits = graph.backward_neighbors[positions].astype(np.int64)
+
+    # Forward citations within year_range -> generality
+    forward, positions = slices(graph.forward_offsets, codes)
+    forward_cits = graph.forward_neighbors[positions].astype(np.int64)
+    cit_years = graph.year[forward_cits].astype(np.int64)
+    lags = take(graph.year, forward_cits, NO_YEAR) - take(
+            graph.year, codes[forward], 0)
+    kept = lags <= year_range
+    forward, forward_cits = forward[kept], forward_cits[kept]
+    forward_buckets = lag_buckets(cit_years[kept] - years[forward])
+
+    owners = np.concatenate([backward, forward])
+    order = np.argsort(owners * 2 + np.repeat([0, 1], [len(backward),
+                                                       len(forward)]),
+                       kind='stable')
+    owners = owners[order]
+    cits = np.concatenate([backward_cits, forward_cits])[order]
+    buckets = np.concatenate([np.full(len(backward), BACKWARD),
+                              forward_buckets])[order]
+
+    cit_index, subsection_codes = subsections(cits)
+    return codes[owners][cit_index], subsection_codes, buckets[cit_index]
+
+
+print('Creating originality and generality measures\n...')
+patent_measures = measures(*citations())
+
+# Creating output file
+with open('../outputs/firm_originality_generality.csv', 'w',
               newline="\n", encoding='utf-8-sig') as output_file:
     output = csv.writer(output_file, delimiter=',')
-    header = ['ipo_firm', 'year', 'patent_id', 'originality', 'generality4', 
+    header = ['ipo_firm', 'year', 'patent_id', 'originality', 'generality4',
               'generality5', 'generality7']
     output.writerow(header)
-    
+
     print('Writing to output file\n...')
-    for row in firm_year_patentcnt:
-        if not row['patent_cnt'] == '0':
-            for patent in row['patent_ids'].split('; '):
-                orig = 0
-                gen4, gen5, gen7 = 0, 0, 0
-                
-                # Calculating originality measure
-                if patent in originality:
-                    len_cit = sum(originality.get(patent).values())
-                    for _, sec in originality.get(patent).items():
-                        orig += (sec / len_cit) ** 2
-                    orig = 1 - orig
-                else:
-                    # N/A if doesn't cite anything (with a subsection_id)
-                    orig = 'N/A'
-                
-                # Calculating generality4 measure
-                if patent in generality4:
-                    len_cit = sum(generality4.get(patent, {}).values())
-                    for _, sec in generality4.get(patent, {}).items():
-                        gen4 += (sec / len_cit) ** 2
-                    gen4 = 1 - gen4
-                else:
-                    # N/A if isn't cited by anything (with a subsection_id)
-                    gen4 = 'N/A'
-                
-                
-                # Calculating generality5 measure
-                if patent in generality5:
-                    counter5 = Counter(generality4.get(patent, {})) + Counter(
-                        generality5.get(patent, {}))
-                    len_cit = sum(counter5.values())
-                    for _, sec in counter5.items():
-                        gen5 += (sec / len_cit) ** 2
-                    gen5 = 1 - gen5
-                else:
-                    # N/A if isn't cited by anything (with a subsection_id)
-                    gen5 = gen4
-                    
-                # Calculating generality7 measure
-                if patent in generality7:
-                    counter7 = counter5 + Counter(generality7.get(patent, {}))
-                    len_cit = sum(counter7.values())
-                    for _, sec in counter7.items():
-                        gen7 += (sec / len_cit) ** 2
-                    gen7 = 1 - gen7
-                else:
-                    # N/A if isn't cited by anything (with a subsection_id)
-                    gen7 = gen5
-                
+    for firm, year, patent_cnt, patent_ids in firm_year_patentcnt:
+        if not patent_cnt == '0':
+            patent_ids = patent_ids.split('; ')
+            for patent, code in zip(patent_ids,
+                                    encode('patent', patent_ids).tolist()):
+                orig, gen4, gen5, gen7 = patent_measures.get(code,
+                                                             NO_MEASURES)
                 output.writerow([
-                        row['ipo_firm'],
-                        row['year'],
+                        firm,
+                        year,
                         patent,
                         orig,
-                        gen4, 
-                        gen5, 
+                        gen4,
+                        gen5,
                         gen7
                     ])
-        
+
 
 print('***\nEND OF PROCESS')
 end_time = time.ctime()
 
 print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
\ No newline at end of file
+print('End Time: ' + end_time)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Firm Year Buckets
+
+Groups the patents of every firm by year, as the rows of
+firm_year_patentcnt.csv: a row for every year from the firm's first year
+to last_year, with the number and the IDs of the firm's patents dated in
+that year. The (firm, patent) pairs are grouped with one sort instead of a
+set per firm and year filled in Python:
+
+    from firm_year_buckets import bucket_patents, in_years
+    buckets = bucket_patents(firms, patents, years, first_years, 2020, 2016)
+    for row in buckets.rows(firm_names, patent_ids):
+        writer.writerow(row)    # [firm, year, patent_cnt, patent_ids]
+
+firms are codes into firm_names (the firms come out in that order) with
+first_years[firm] the first year of each firm, patents are codes into
+patent_ids (the IDs of a firm year are joined in code order) and years the
+year of every pair, MISSING if it has none. Pairs dated before the first
+year of their firm or after last_patent_year are left out; a patent is
+counted once per firm and year.
+
+The date column is a parameter, so the same pairs can be bucketed by grant
+year and by application year in one run (see firm_year_patent.py).
+"""
+
+import numpy as np
+
+from id_codes import MISSING
+
+
+class FirmYearBuckets:
+    """The patents of every firm year, grouped like a CSR graph."""
+
+    def __init__(self, firms, years, offsets, patents):
+        # firm and year of every row, firm by firm, years ascending
+        self.firms = firms
+        self.years = years
+        # the patent codes of row r are patents[offsets[r]:offsets[r + 1]]
+        self.offsets = offsets
+        self.patents = patents
+
+    def __len__(self):
+        return len(self.firms)
+
+    def counts(self):
+        """Number of patents of every row."""
+        return np.diff(self.offsets)
+
+    def rows(self, firm_names, patent_ids, firms=None):
+        """
+        Yields [firm, year, patent_cnt, patent_ids] for every row, only for
+        the firms set in the firms mask if there is one.
+        """
+        ids = np.asarray(patent_ids)[self.patents].tolist()
+        offsets = self.offsets.tolist()
+        for r, (firm, year) in enumerate(zip(self.firms.tolist(),
+                                             self.years.tolist())):
+            if firms is not None and not firms[firm]:
+                continue
+            row_ids = ids[offsets[r]:offsets[r + 1]]
+            yield [firm_names[firm], year, len(row_ids), '; '.join(row_ids)]
+
+
+def in_years(firms, years, first_years, last_year):
+    """Whether the year of every pair is in first_years[firm]..last_year."""
+    firms = np.asarray(firms)
+    years = np.asarray(years)
+    return ((years != MISSING) & (years >= np.asarray(first_years)[firms]) &
+            (years <= last_year))
+
+
+def bucket_patents(firms, patents, years, first_years, last_year,
+                   last_patent_year=None):
+    """
+    The firm year rows of (firm, patent) pairs with a year each: a row for
+    every year from first_years[firm] to last_year, holding the pairs
+    dated from first_years[firm] to last_patent_year (last_year if not
+    given).
+    """
+    firms = np.asarray(firms, dtype=np.int64)
+    patents = np.asarray(patents, dtype=np.int64)
+    years = np.asarray(years, dtype=np.int64)
+    first_years = np.asarray(first_years, dtype=np.int64)
+    if last_patent_year is None or last_patent_year > last_year:
+        last_patent_year = last_year
+
+    # one row for every year of every firm
+    row_counts = np.maximum(last_year - first_years + 1, 0)
+    row_starts = np.zeros(len(first_years) + 1, dtype=np.int64)
+    np.cumsum(row_counts, out=row_starts[1:])
+    row_firms = np.repeat(np.arange(len(first_years)), row_counts)
+    row_years = (np.arange(row_starts[-1]) - row_starts[row_firms] +
+                 first_years[row_firms])
+
+    keep = (in_years(firms, years, first_years, last_patent_year) &
+            (patents != MISSING))
+    firms, patents, years = firms[keep], patents[keep], years[keep]
+    rows = row_starts[firms] + years - first_years[firms]
+
+    # sort the pairs by row, then patent, and drop repeated ones
+    order = np.lexsort((patents, rows))
+    rows, patents = rows[order], patents[order]
+    first = np.r_[True, (rows[1:] != rows[:-1]) |
+                  (patents[1:] != patents[:-1])][:len(rows)]
+    rows, patents = rows[first], patents[first]
+
+    offsets = np.zeros(len(row_firms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(row_firms)), out=offsets[1:])
+    return FirmYearBuckets(row_firms, row_years, offsets, patents)
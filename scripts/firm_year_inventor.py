@@ -18,101 +18,130 @@ and outputs/inventor_patents, which has the header:
 
 import time
 import csv
+import numpy as np
+from tsv_cache import load_columns
+from tsv_reader import read_rows
+from id_codes import MISSING, encode, load_codes, load_ids, lookup_table
 
 print('***\nBEGIN PROCESS')
 start_time = time.ctime()
 
-# Load patent_assignee
-patent_assignee_file = open('../patent_data/patent_assignee.tsv', 
-                            encoding='utf-8-sig')
-patent_assignee = csv.DictReader(patent_assignee_file, delimiter='\t')
 
-# Create patent to assignee dictionary
-print('Creating assignee dict\n...')
-patent_to_assignee = {}
-for row in patent_assignee:
-    patent_to_assignee[row['patent_id']] = row['assignee_id']
+def grouped_rows(codes, size):
+    """
+    (offsets, rows): the rows of code k are rows[offsets[k]:offsets[k + 1]],
+    in file order.
+    """
+    codes = np.asarray(codes)
+    rows = np.flatnonzero(codes != MISSING)
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[rows], minlength=size), out=offsets[1:])
+    return offsets, rows
+
+
+# Patents, assignees, inventors and locations are handled as int codes (see
+# id_codes.py), the lookups are arrays indexed by code holding the row of
+# the TSV to read (like a dict, the last row of an ID wins)
+
+# Create patent to assignee table (TSV columns are parsed once, then read 
+# from the cache)
+print('Creating assignee table\n...')
+assignee_codes = load_codes('../patent_data/patent_assignee.tsv', 
+                            'assignee_id', 'assignee')
+patent_to_assignee = lookup_table(
+        'patent', 
+        load_codes('../patent_data/patent_assignee.tsv', 'patent_id'), 
+        assignee_codes)
+assignee_ids = load_ids('assignee')
+
+
+def assignees_of(patents):
+    """assignee_id of every patent code, 'N/A' if it has none"""
+    assignees = patent_to_assignee[patents]
+    assignees[np.asarray(patents) == MISSING] = MISSING
+    found = assignees != MISSING
+    ids = np.full(len(assignees), 'N/A', dtype=object)
+    ids[found] = assignee_ids[assignees[found]].tolist()
+    return ids.tolist()
+
 
 # Load patent_inventor
-patent_inventor_file = open('../patent_data/patent_inventor.tsv', 
-                            encoding='utf-8-sig')
-patent_inventor = csv.DictReader(patent_inventor_file, delimiter='\t')
-
-# Create inventor to details dictionary
-print('Creating patent to details dict\n...')
-inventor_to_details = {} #id -> [name_last, name_first, location_id, male]
-
-# Create patent to inventor dictionary
-print('Creating patent to inventor dict\n...')
-patent_to_inventors = {}
-inventor_to_patents = {} 
-for row in patent_inventor:
-    inventor_lst = patent_to_inventors.get(row['patent_id'], [])
-    inventor_lst.append(row['inventor_id'])
-    patent_to_inventors[row['patent_id']] = inventor_lst
-    
-    patent_lst = inventor_to_patents.get(row['inventor_id'], [])
-    patent_lst.append(row['patent_id'])
-    inventor_to_patents[row['inventor_id']] = patent_lst
-    
-    # Get location id
-    details = inventor_to_details.get(row['inventor_id'], [None] * 4)
-    lst = details[2]
-    if not lst:
-        lst = []
-    lst.append(row['location_id'])
-    details[2] = lst
-    inventor_to_details[row['inventor_id']] = details
-    
+patent_inventor = load_columns('../patent_data/patent_inventor.tsv', 
+                               ['patent_id', 'inventor_id'])
+patent_inventor_patents = load_codes('../patent_data/patent_inventor.tsv', 
+                                     'patent_id')
+patent_inventor_inventors = load_codes('../patent_data/patent_inventor.tsv', 
+                                       'inventor_id', 'inventor')
+patent_inventor_locations = load_codes('../patent_data/patent_inventor.tsv', 
+                                       'location_id', 'location')
+
+# Group the patent_inventor rows by patent (the inventors of a patent) and by
+# inventor (the locations of an inventor)
+print('Creating patent to inventor table\n...')
+patent_offsets, patent_rows = grouped_rows(patent_inventor_patents, 
+                                           len(load_ids('patent')))
+inventor_offsets, inventor_rows = grouped_rows(patent_inventor_inventors, 
+                                               len(load_ids('inventor')))
+inventor_locations = patent_inventor_locations[inventor_rows]
+
 # Load inventor
-inventor_file = open('../patent_data/inventor.tsv', encoding='utf-8-sig')
-inventor = csv.DictReader(inventor_file, delimiter='\t')
+inventor_names = load_columns('../patent_data/inventor.tsv', 
+                              ['id', 'name_last', 'name_first'])
 
 # Load inventor_gender
-inventor_gender_file = open('../patent_data/inventor_gender.tsv', 
-                            encoding='utf-8-sig')
-inventor_gender = csv.DictReader(inventor_gender_file, delimiter='\t')
-
-# Continue inventor to details dictionary
-print('Continue creating patent to details dict\n...')
-for row in inventor:
-    if row['id'] in inventor_to_details:
-        inventor_to_details[row['id']][0] = row['name_last']
-        inventor_to_details[row['id']][1] = row['name_first']
-    else:
-        inventor_to_details[row['id']] = [
-                row['name_last'], 
-                row['name_first'], 
-                None, 
-                None
-            ]
-    
-for row in inventor_gender:
-    details = inventor_to_details.get(row['disamb_inventor_id_20200929'])
-    if details:
-        details[3] = row['male'] #0 is female, 1 is male
-        inventor_to_details[row['disamb_inventor_id_20200929']] = details
+inventor_gender = load_columns('../patent_data/inventor_gender.tsv', 
+                               ['disamb_inventor_id_20200929', 'male'])
+
+# Create inventor to name and gender tables
+print('Creating inventor to details table\n...')
+inventor_to_name = lookup_table(
+        'inventor', load_codes('../patent_data/inventor.tsv', 'id', 'inventor'), 
+        np.arange(len(inventor_names['id'])), dtype=np.int64)
+inventor_to_gender = lookup_table(
+        'inventor', 
+        encode('inventor', inventor_gender['disamb_inventor_id_20200929']), 
+        np.arange(len(inventor_gender['male'])), dtype=np.int64)
+
+
+def inventor_details(inventor):
+    """[name_last, name_first, gender], '' where unknown"""
+    details = ['', '', '']
+    row = inventor_to_name[inventor]
+    if row != MISSING:
+        details[0] = inventor_names['name_last'][row]
+        details[1] = inventor_names['name_first'][row]
+    row = inventor_to_gender[inventor]
+    if row != MISSING:
+        details[2] = inventor_gender['male'][row] #0 is female, 1 is male
+    return details
+
 
 # Load location
-location_file = open('../patent_data/location.tsv', encoding='utf-8-sig')
-location = csv.DictReader(location_file, delimiter='\t')
-
-# Create location to details dictionary
-print('Creating location to details dict\n...')
-location_to_details = {} #id -> [city, state, country, latitude, longitude]
-for row in location:
-    location_to_details[row['id']] = [
-            row['city'],
-            row['state'], 
-            row['country'], 
-            row['latitude'], 
-            row['longitude'], 
-        ]
+location = load_columns('../patent_data/location.tsv', 
+                        ['id', 'city', 'state', 'country', 'latitude', 
+                         'longitude'])
+
+# Create location to details table
+print('Creating location to details table\n...')
+location_to_row = lookup_table(
+        'location', load_codes('../patent_data/location.tsv', 'id', 'location'), 
+        np.arange(len(location['id'])), dtype=np.int64)
+location_columns = ['city', 'state', 'country', 'latitude', 'longitude']
+
+
+def location_details(loc):
+    """[city, state, country, latitude, longitude]"""
+    if loc == MISSING or location_to_row[loc] == MISSING:
+        return ['N/A'] * 5
+    return [location[column][location_to_row[loc]] 
+            for column in location_columns]
+
 
 # Load Kenneth table
-firm_year_patentcnt_file = open('../outputs/firm_year_patentcnt_REVISED.csv', 
-                            encoding='utf-8-sig')
-firm_year_patentcnt = csv.DictReader(firm_year_patentcnt_file, delimiter=',')
+firm_year_patentcnt = read_rows('../outputs/firm_year_patentcnt_REVISED.csv', 
+                                ['ipo_firm', 'year', 'patent_ids'], 
+                                delimiter=',')
 
 # Write to output file
 print('Creating output file 1 (firm_year_inventor)\n...')
@@ -125,30 +154,26 @@ with open('../outputs/firm_year_inventor.csv', 'w',
     output1.writerow(header)
     
     print('Writing to output file\n...')
-    na4 = ['N/A'] * 4
-    na5 = ['N/A'] * 5
-    for row in firm_year_patentcnt:
-        for patent in row['patent_ids'].split('; '):
-            for inventor in patent_to_inventors.get(patent, []):
-                inv_details = inventor_to_details.get(inventor, na4)
-                if inv_details[2]:
-                    for loc in inv_details[2]:
-                        loc_details = location_to_details.get(loc, na5)
-                        output1.writerow([
-                                row['ipo_firm'], 
-                                row['year'],
-                                inventor,
-                                patent,
-                                patent_to_assignee.get(patent, 'N/A'),
-                                inv_details[0],
-                                inv_details[1],
-                                inv_details[3],
-                                loc_details[0],
-                                loc_details[1],
-                                loc_details[2],
-                                loc_details[3],
-                                loc_details[4],
-                            ])
+    for firm, year, patent_ids in firm_year_patentcnt:
+        patents = patent_ids.split('; ')
+        codes = encode('patent', patents)
+        for patent, code, assignee in zip(patents, codes.tolist(), 
+                                          assignees_of(codes)):
+            if code == MISSING:
+                continue
+            for row in patent_rows[patent_offsets[code]:
+                                   patent_offsets[code + 1]].tolist():
+                inventor = int(patent_inventor_inventors[row])
+                if inventor == MISSING:
+                    continue
+                details = inventor_details(inventor)
+                for loc in inventor_locations[
+                        inventor_offsets[inventor]:
+                        inventor_offsets[inventor + 1]].tolist():
+                    output1.writerow([firm, year, 
+                                      patent_inventor['inventor_id'][row], 
+                                      patent, assignee] + details + 
+                                     location_details(loc))
 
 print('Creating output file 2 (inventor_patent)\n...')
 with open('../outputs/inventor_patent.csv', 'w', 
@@ -157,14 +182,18 @@ with open('../outputs/inventor_patent.csv', 'w',
     header = ['inventor_id', 'patent_id', 'assignee_id']
     output2.writerow(header)
     
+    # Every inventor in the order of its first patent_inventor row, with its 
+    # patents in file order, written a million rows at a time
     print('Writing to output file\n...')
-    for inventor, patents in inventor_to_patents.items():
-        for patent in patents:
-            output2.writerow([
-                    inventor, 
-                    patent, 
-                    patent_to_assignee.get(patent, 'N/A')
-                ])
+    _, first_rows, inverse = np.unique(patent_inventor_inventors, 
+                                       return_index=True, return_inverse=True)
+    order = np.argsort(first_rows[inverse], kind='stable')
+    for start in range(0, len(order), 1000000):
+        rows = order[start:start + 1000000]
+        output2.writerows(zip(
+                patent_inventor['inventor_id'][rows].tolist(), 
+                patent_inventor['patent_id'][rows].tolist(), 
+                assignees_of(patent_inventor_patents[rows])))
 
 print('***\nEND OF PROCESS')
 end_time = time.ctime()
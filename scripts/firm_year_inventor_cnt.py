@@ -3,115 +3,120 @@
 """
 Maps firm, year to the number of inventors
 
-Outputs file firm_year_inventor_cnt.csv with header: 
-    ipo_firm, year, num_inventors, loss, gain, 
+Outputs file firm_year_inventor_cnt.csv with header:
+    ipo_firm, year, num_inventors, loss, gain,
     ipo_inventors_left, ipo_inventors_returned
 
+The turnover metrics are computed by inventor_turnover.py, one firm at a time.
+
+Usage: python firm_year_inventor_cnt.py [--workers N]
+    --workers N computes the firms in N processes (default 1), the output
+    file is identical.
+
 @author: Audrey Yang (auyang@seas.upenn.edu)
 """
 
-import time
+import argparse
 import csv
-
-print('***\nBEGIN PROCESS')
-start_time = time.ctime()
-
-# Load ipo_10000
-ipo_10000_file = open('../firms/ipo_10000.csv')
-ipo_10000 = csv.DictReader(ipo_10000_file, delimiter=',')
-
-# Create ipo year dict
-print('Creating IPO year dict\n...')
-firm_ipo_year = {}
-for row in ipo_10000:
-    firm = row['ï»¿firm'].strip()
-    firm_ipo_year[firm] = int(row['ipo_date'][:4])
-
-# Load inventor_year_dominant_firm
-dominant_firm_file = open('../outputs/inventor_year_dominant_firm.csv', 
-                      encoding='utf-8-sig')
-dominant_firm = csv.DictReader(dominant_firm_file, delimiter=',')
-
-# Create firm year to inventor dict
-print('Creating firm year to inventors dict\n...')
-firm_year_inventor = {}
-for row in dominant_firm:
-    # Skip if N/A or non-ipo firm
-    if (row['extrapolated_dominant_assignee'] == 'N/A' or
-        row['extrapolated_dominant_assignee'] not in firm_ipo_year):
-        continue
-
-    # Get firms -> years
-    years = firm_year_inventor.get(row['extrapolated_dominant_assignee'], {})
-    # Get years -> inventors
-    inventors = years.get(int(row['year']), set())
-    # Add to inventor set
-    inventors.add(row['inventor_id'])
-    years[int(row['year'])] = inventors
-    firm_year_inventor[row['extrapolated_dominant_assignee']] = years
+import math
+import multiprocessing
+import time
+import numpy as np
+from tsv_reader import read_rows
+from inventor_turnover import group_by_firm, init_worker, turnover_chunk
 
 this_year = 2021
 
-# Write to output file
-print('Writing to output file\n...')
-with open('../outputs/firm_year_inventor_cnt.csv', 'w', 
-          newline='\n', encoding='utf-8-sig') as output_file:
-    output = csv.writer(output_file, delimiter=',')
-    header = ['ipo_firm', 'year', 'num_inventors', 
-    'loss', 'gain', 'ipo_inventors_left', 'ipo_inventors_returned']
-    output.writerow(header)
-
-    for firm, years in firm_year_inventor.items():
-        ipo_year = firm_ipo_year.get(firm)
-        if not ipo_year: # Skip if non-ipo firm
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Inventor turnover of every IPO firm and year.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes computing firms (default 1)')
+    args = parser.parse_args()
+
+    print('***\nBEGIN PROCESS')
+    start_time = time.ctime()
+
+    # Load ipo_10000
+    ipo_10000 = read_rows('../firms/ipo_10000.csv',
+                          {'firm': 'str', 'ipo_date': 'year'}, delimiter=',')
+
+    # Create ipo year dict
+    print('Creating IPO year dict\n...')
+    firm_ipo_year = {}
+    for firm, ipo_year in ipo_10000:
+        firm_ipo_year[firm.strip()] = ipo_year
+
+    # Load inventor_year_dominant_firm, with firms and inventors as ints
+    # (numbered in order of appearance)
+    print('Creating firm year to inventors arrays\n...')
+    firm_codes = {}
+    inventor_codes = {}
+    firms, years, inventors = [], [], []
+    for inventor, year, firm in read_rows(
+            '../outputs/inventor_year_dominant_firm.csv',
+            ['inventor_id', 'year', 'extrapolated_dominant_assignee'],
+            delimiter=','):
+        # Skip if N/A or non-ipo firm
+        if firm == 'N/A' or firm not in firm_ipo_year:
             continue
-        while ipo_year not in years and ipo_year <= this_year:
-            ipo_year += 1
-
-        if ipo_year == this_year + 1:
-            print(firm)
-            continue    
-
-        ipo_inventors = years[ipo_year]
-        start = min(years.keys())
-        output.writerow([firm, start, len(years[start]), 0, 0])
-        last = start
-        for i in range(start + 1, ipo_year):
-            if i not in years:
-                output.writerow([firm, i, len(years[last]), 0, 0, 
-                    'N/A', 'N/A'])
-            else:
-                intersect = years[i].intersection(years[last])
-                loss = len(years[last].difference(intersect))
-                gain = len(years[i].difference(intersect))
-                output.writerow([firm, i, len(years[i]), loss, gain, 
-                    'N/A', 'N/A'])
-                last = i
-
-        for i in range(ipo_year, this_year):
-            if i not in years:
-                ipo_year_intersect = years[last].intersection(ipo_inventors)
-                ipo_loss = len(ipo_inventors.difference(ipo_year_intersect))
-                output.writerow([firm, i, len(years[last]), 0, 0, ipo_loss, 0])
-            else:
-                last_intersect = years[i].intersection(years[last])
-                loss = len(years[last].difference(last_intersect))
-                gain = len(years[i].difference(last_intersect))
-
-                ipo_year_intersect = years[i].intersection(ipo_inventors)
-                ipo_loss = len(ipo_inventors.difference(ipo_year_intersect))
-                # ipo inventors in year i that weren't there in the last year
-                ipo_return = len(ipo_year_intersect.difference(years[last]))
-
-                if i == ipo_year:
-                    ipo_return = 0
-
-                output.writerow([firm, i, len(years[i]), loss, gain, 
-                    ipo_loss, ipo_return])
-                last = i
-
-print('***\nEND OF PROCESS')
-end_time = time.ctime()
-
-print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
\ No newline at end of file
+        firms.append(firm_codes.setdefault(firm, len(firm_codes)))
+        years.append(int(year))
+        inventors.append(inventor_codes.setdefault(inventor,
+                                                   len(inventor_codes)))
+
+    # Group the inventors by firm and year once
+    years, inventors, offsets = group_by_firm(firms, years, inventors)
+    firm_names = list(firm_codes)
+    turnover_args = (firm_names, [firm_ipo_year[firm] for firm in firm_names],
+                     years, inventors, offsets, this_year)
+
+    # Split the firms into chunks of about the same number of inventor
+    # years, a few per worker
+    firm_cnt = len(offsets) - 1
+    chunk_cnt = max(1, min(firm_cnt, args.workers * 8,
+                           math.ceil(len(years) / 10000)))
+    bounds = np.searchsorted(offsets, np.linspace(0, len(years), chunk_cnt + 1))
+    bounds[-1] = firm_cnt
+    chunks = [(lo, hi) for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+              if lo < hi]
+
+    # Write to output file
+    print('Writing to output file\n...')
+    with open('../outputs/firm_year_inventor_cnt.csv', 'w',
+              newline='\n', encoding='utf-8-sig') as output_file:
+        output = csv.writer(output_file, delimiter=',')
+        header = ['ipo_firm', 'year', 'num_inventors',
+        'loss', 'gain', 'ipo_inventors_left', 'ipo_inventors_returned']
+        output.writerow(header)
+
+        if args.workers > 1:
+            pool = multiprocessing.Pool(args.workers, init_worker, turnover_args)
+            # imap hands the chunks back in order, which keeps the output
+            # deterministic
+            results = pool.imap(turnover_chunk, chunks)
+        else:
+            pool = None
+            init_worker(*turnover_args)
+            results = map(turnover_chunk, chunks)
+
+        for text, skipped in results:
+            # Firms without inventors from their IPO year on
+            for firm in skipped:
+                print(firm)
+            output_file.write(text)
+
+        if pool:
+            pool.close()
+            pool.join()
+
+    print('***\nEND OF PROCESS')
+    end_time = time.ctime()
+
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
+
+
+if __name__ == '__main__':
+    main()
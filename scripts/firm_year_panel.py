@@ -0,0 +1,214 @@
+# Kenneth Shinn
+# kshinn@sas.upenn.edu
+#
+# This code builds the firm year analysis panel in one step. It replaces the chain
+# process_analyst.py -> aggregate_generality_originality.py -> f_y_i_analyst.py (+ process_pp_sb.py),
+# which wrote firm_year_analyst_coverage.csv, firm_year_innovation.csv and
+# firm_year_pp_sb_coverage.csv on the way.
+#
+# The firm years are the (ipo_firm, year) keys of firm_year_patentcnt_REVISED.csv. Every feature
+# table is hash joined onto them in memory: a dict maps each key to its panel row, and the
+# feature columns are filled in by looking up the keys of the feature rows.
+#
+# Needs in the dependent data folder:
+#   firm_year_patentcnt_REVISED.csv, firm_originality_generality.csv, firm_forward_citation_cnt.csv,
+#   analyst_coverage.csv, ipo_10000.csv (with 'Offer date' and 'dual dum'), poison_pill_coverage.csv
+#
+# Outputs outputs/f_y_i_analyst.csv with the columns of the old f_y_i_analyst.csv followed by
+# is_pp, is_sb
+#
+#########################################################################################
+
+import csv
+import time
+
+import numpy as np
+
+
+def read_csv(path):
+	"""The rows of a csv file as dicts."""
+	with open(path, encoding='utf-8-sig') as csv_file:
+		return list(csv.DictReader(csv_file, delimiter=","))
+
+
+def key_index(rows):
+	"""(ipo_firm, year) -> panel row, in order of first appearance."""
+	index = {}
+	for row in rows:
+		index.setdefault((row['ipo_firm'], row['year']), len(index))
+	return index
+
+
+def hash_join(index, rows, columns, default):
+	"""
+	Columns of the rows joined onto the panel keys (one list per column, default where a key has
+	no row, the last row wins where it has several).
+	"""
+	joined = [[default] * len(index) for column in columns]
+	for row in rows:
+		i = index.get((row['ipo_firm'], row['year']))
+		if i is not None:
+			for values, column in zip(joined, columns):
+				values[i] = row[column]
+	return joined
+
+
+def average_columns(index, rows, columns):
+	"""
+	Averages of the columns per panel key, leaving out 'N/A' (0 if a key has no values). Stops at
+	the first row with a key that isn't in the panel.
+	"""
+	keys = []
+	for row in rows:
+		i = index.get((row['ipo_firm'], row['year']))
+		if i is None:
+			print('ERROR FIRM YEAR NOT FOUND!!')
+			rows = rows[:len(keys)]
+			break
+		keys.append(i)
+	keys = np.array(keys, dtype=np.int64)
+
+	averages = []
+	for column in columns:
+		values = np.array([row[column] for row in rows], dtype=object)
+		valid = values != 'N/A'
+		# bincount adds the values of each key in row order, like a running sum
+		sums = np.bincount(keys[valid], weights=values[valid].astype(np.float64),
+						   minlength=len(index))
+		cnts = np.bincount(keys[valid], minlength=len(index))
+		averages.append([s / c if c > 0 else 0 for s, c in zip(sums.tolist(), cnts.tolist())])
+	return averages
+
+
+def analyst_coverage(rows):
+	"""(ticker, year) -> (analyst opinion count, number of unique analysts)"""
+	opinion_cnts = {}
+	analysts = {}
+	for row in rows:
+		key = (row['TICKER'], row['ANNDATS'][:4])
+		opinion_cnts[key] = opinion_cnts.get(key, 0) + 1
+		analysts.setdefault(key, set()).add(row['ANALYS'])
+	return {key: (cnt, len(analysts[key])) for key, cnt in opinion_cnts.items()}
+
+
+def pp_sb_years(rows):
+	"""
+	firm -> (years with a poison pill, years with a staggered board), from the adoption, withdrawn
+	and expiration dates of the poison pills.
+	"""
+	pp_sb_dict = {}
+	for row in rows:
+		end_year = row['Withdrawn_Date'][-4:]
+		if end_year == '':
+			end_year = row['Expiration_Date'][-4:]
+		pp_sb_dict.setdefault((row['IPO_name'], row['Issuer_CUSIP_SDC']), []).append((
+				row['Date_of_Adoption'].split('/')[0],
+				row['Date_of_Adoption'][-4:],
+				end_year,
+				row['Staggered_Board']))
+
+	firm_years = {}
+	for (firm, cusip), dates in pp_sb_dict.items():
+		sb_set = set()
+		pp_set = set()
+		last_end = ''
+		# a pill lasts until it ends or the next one is adopted
+		for (start_month, start_year, end_year, is_sb), (next_start_month, next_start_year,
+				next_end_year, next_is_sb) in zip(dates[:-1], dates[1:]):
+			last_end = end_year
+			if end_year == '':
+				true_end = next_start_year
+			elif next_start_year == '':
+				true_end = end_year
+			else:
+				true_end = min(end_year, next_start_year)
+
+			if true_end == '':
+				continue
+
+			for year in range(int(start_year), int(true_end)):
+				pp_set.add(year)
+				if is_sb == 'Yes':
+					sb_set.add(year)
+			if int(next_start_month) > 6 and is_sb == 'Yes':
+				sb_set.add(int(true_end))
+
+		# the last pill lasts until it ends (or the one before it ended)
+		start_month, start_year, end_year, is_sb = dates[-1]
+		if end_year == '':
+			end_year = last_end or start_year
+		for year in range(int(start_year), int(end_year) + 1):
+			pp_set.add(year)
+			if is_sb == 'Yes':
+				sb_set.add(year)
+		firm_years[firm] = (pp_set, sb_set)
+	return firm_years
+
+
+def main():
+	# start time
+	start_time = time.ctime()
+
+	print('READING FILES\n')
+	firm_year_patentcnt = read_csv('dependent_data/firm_year_patentcnt_REVISED.csv')
+	og = read_csv('dependent_data/firm_originality_generality.csv')
+	forward_cite = read_csv('dependent_data/firm_forward_citation_cnt.csv')
+	analyst = read_csv('dependent_data/analyst_coverage.csv')
+	ipo = read_csv('dependent_data/ipo_10000.csv')
+	pp_sb = read_csv('dependent_data/poison_pill_coverage.csv')
+
+	# the panel keys
+	index = key_index(firm_year_patentcnt)
+	keys = list(index)
+
+	print('JOINING FEATURES\n')
+	patent_cnt, patent_ids = hash_join(index, firm_year_patentcnt, ['patent_cnt', 'patent_ids'], '')
+	og_columns = ['originality', 'generality4', 'generality5', 'generality7']
+	og_averages = average_columns(index, og, og_columns)
+	# forward_cnt4, forward_cnt5, forward_cnt7 (or the windows firm_forward_citation_cnt.py counted)
+	forward_columns = [column for column in forward_cite[0] if column not in ('ipo_firm', 'year')] \
+		if forward_cite else ['forward_cnt4', 'forward_cnt5', 'forward_cnt7']
+	forward_cnts = hash_join(index, forward_cite, forward_columns, 'N/A')
+
+	# name -> ticker, ipo year, dual dum
+	ipo_dict = {}
+	for row in ipo:
+		ipo_dict[row['firm'].strip()] = (row['ticker'], row['Offer date'][:4], row['dual dum'])
+
+	coverage = analyst_coverage(analyst)
+	firm_pp_sb = pp_sb_years(pp_sb)
+	no_pp_sb = (set(), set())
+
+	# create an output file (innovation_analyst)
+	print('CREATING OUTPUT FILE\n')
+	with open('outputs/f_y_i_analyst.csv', 'w', newline="\n", encoding='utf-8-sig') as output:
+		panel = csv.writer(output, delimiter=',')
+		header = ['ipo_firm', 'year', 'is_ipo_year', 'dual_dum'] + og_columns + \
+			['patent_cnt', 'patent_ids'] + forward_columns + \
+			['analyst_opinion_cnt', 'unique_analysts', 'is_pp', 'is_sb']
+		panel.writerow(header)
+
+		for i, (firm, year) in enumerate(keys):
+			ticker, ipo_year, dual_dum = ipo_dict[firm]
+			is_ipo_year = 1 if year == ipo_year else 0
+			analyst_opinion_cnt, unique_analysts = coverage.get((ticker, year), (0, 0))
+			pp_set, sb_set = firm_pp_sb.get(firm, no_pp_sb)
+
+			panel.writerow([firm, year, is_ipo_year, dual_dum] +
+				[values[i] for values in og_averages] +
+				[patent_cnt[i], patent_ids[i]] +
+				[values[i] for values in forward_cnts] +
+				[analyst_opinion_cnt, unique_analysts,
+				 1 if int(year) in pp_set else 0, 1 if int(year) in sb_set else 0])
+
+	# END OF PROCESS ##
+	print('\nEND OF PROCESS\n')
+
+	end_time = time.ctime()
+
+	print('Start Time: ' + start_time)
+	print('End Time: ' + end_time + '\n')
+
+
+if __name__ == '__main__':
+	main()
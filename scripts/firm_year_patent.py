@@ -10,54 +10,67 @@
 # This script will return a csv file that includes the patent counts per year for each IPO firm with a patent
 # There will also be a column of patent ID for checking and testing.
 #
+# The same run also writes firm_year_patentcnt_REVISED.csv, with the patents counted above bucketed by
+# application year rather than grant year (see adjust_application_date.py).
+#
+# Usage: python firm_year_patent.py [--last-year 2020] [--last-patent-year 2016]
+#
 # NOTE: Patents outside of the relevant date range are ignored.
 # 		Patent counts returned by this script will be lower than the counts in the matching file.
 #
 ########################################################################################################################
 
+import argparse
 import csv
-import math
 import time
+import numpy as np
+from tsv_cache import load_columns
+from tsv_reader import read_rows
+from date_table import load_dates
+from firm_year_buckets import bucket_patents, in_years
+from id_codes import MISSING, encode, load_codes, load_ids
+
+# year bounds (buckets run from each firm's Founding year to --last-year, patents dated after
+# --last-patent-year are left out)
+parser = argparse.ArgumentParser(description='Patent counts per IPO firm and year.')
+parser.add_argument('--last-year', type=int, default=2020,
+                    help='last year bucket of firm_year_patentcnt.csv (default 2020)')
+parser.add_argument('--last-patent-year', type=int, default=2016,
+                    help='last year of a counted patent, and last year bucket of '
+                         'firm_year_patentcnt_REVISED.csv (default 2016)')
+args = parser.parse_args()
+# no patent is counted past the last year bucket
+args.last_patent_year = min(args.last_patent_year, args.last_year)
 
 # start time
 start_time = time.ctime()
 
 # load in the ipo_match file
-ipo_match_file = open('../outputs/name_matches.csv', encoding='utf-8-sig')
-ipo_match = csv.DictReader(ipo_match_file, delimiter=",")
+ipo_match = read_rows('../outputs/name_matches.csv', ['ipo_firm', 'assignee_firm'],
+                      delimiter=",")
 
 # load in the ipo file
-ipo_file = open('../firms/ipo_10000.csv', encoding='utf-8-sig')
-ipo = csv.DictReader(ipo_file, delimiter=",")
-
-# load in the assignee file
-assignee_file = open('../patent_data/assignee.tsv', encoding='utf-8-sig')
-assignee = csv.DictReader(assignee_file, delimiter="\t")
-
-# load in the patent_assignee file
-patent_assignee_file = open(
-    '../patent_data/patent_assignee.tsv', encoding='utf-8-sig')
-patent_assignee = csv.DictReader(patent_assignee_file, delimiter="\t")
-
-# load in the patent file
-patent_file = open('../patent_data/patent.tsv', encoding='utf-8-sig')
-patent = csv.DictReader(patent_file, delimiter="\t")
-
-# create an output file (firm year patent cnt)
-output = open('../outputs/firm_year_patentcnt.csv',
-              'w', newline="\n", encoding='utf-8-sig')
-firm_year_patentcnt = csv.writer(output, delimiter=',')
-header = ['ipo_firm', 'year', 'patent_cnt', 'patent_ids']
-firm_year_patentcnt.writerow(header)
+ipo = read_rows('../firms/ipo_10000.csv', ['firm', 'Founding'], delimiter=",")
+
+# load in the assignee columns (parsed once, then read from the cache, see tsv_cache.py)
+assignee = load_columns('../patent_data/assignee.tsv', ['firm', 'id'])
+
+# load in the patent_assignee columns as int codes (see id_codes.py)
+patent_assignee_patents = load_codes('../patent_data/patent_assignee.tsv', 'patent_id')
+patent_assignee_assignees = load_codes('../patent_data/patent_assignee.tsv', 'assignee_id',
+                                       kind='assignee')
+
+# grant and application year of every patent code (see date_table.py)
+dates = load_dates()
 
 # go through the ipo_match file and create a dictionary, key ipo, value set of assignee alias
 # also create a set of (relevant) assignee aliases
 print('INGESTING IPO ASSIGNEE MATCHES\n')
 ipo_alias = {}
 all_assignee_alias = set()
-for i in ipo_match:
-    ipo_firm = i['ipo_firm'].strip()
-    assignee_alias = i['assignee_firm'].strip()
+for ipo_firm, assignee_alias in ipo_match:
+    ipo_firm = ipo_firm.strip()
+    assignee_alias = assignee_alias.strip()
 
     all_assignee_alias.add(assignee_alias)
 
@@ -70,80 +83,80 @@ for i in ipo_match:
 # go through the ipo file and get the start dates
 print('INGESTING IPOS\n')
 ipo_start_dates = {}
-for i in ipo:
-    ipo_firm = i['firm'].strip()
-    start_date = i['Founding'].strip()
-    ipo_start_dates[ipo_firm] = start_date
-
-
-# go through the patent data, generate a patent_id - year dictionary
-print('INGESTING PATENTS\n')
-patent_id_year = {}
-for p in patent:
-    patent_id = p['id'].strip()
-    # TODO: HERE TO GET MORE INFO ABOUT PATENT, just want to get the year now
-    year = int(p['date'][0:4])
-    patent_id_year[patent_id] = year
-
-# generate a set of relevant assignee_id from set of relevant assignee aliases
-# also generate assignee name to id
+for ipo_firm, start_date in ipo:
+    ipo_start_dates[ipo_firm.strip()] = start_date.strip()
+
+# firms are numbered in the order of the matches file, which is the order of the output
+ipo_firms = list(ipo_alias)
+first_years = [int(ipo_start_dates[ipo]) for ipo in ipo_firms]
+
+# generate an assignee name to id dictionary for the relevant assignee aliases
 print('INGESTING ASSIGNEES\n')
 assignee_name_id = {}
-all_assignee_ids = set()
-for a in assignee:
-    assignee_firm = a['firm'].strip()
-    assignee_id = a['id'].strip()
-    assignee_name_id[assignee_firm] = assignee_id
+for assignee_firm, assignee_id in zip(assignee['firm'].tolist(), assignee['id'].tolist()):
+    assignee_firm = assignee_firm.strip()
     if assignee_firm in all_assignee_alias:
-        all_assignee_ids.add(assignee_id)
-
-
-# go through the assignee - patent connector, generate a assignee - patent_id set dictionary
+        assignee_name_id[assignee_firm] = assignee_id.strip()
+
+# (firm, assignee) pairs, one per alias of every ipo
+firm_assignee_firms = []
+firm_assignee_ids = []
+for firm, ipo in enumerate(ipo_firms):
+    for a in ipo_alias[ipo]:
+        firm_assignee_firms.append(firm)
+        firm_assignee_ids.append(assignee_name_id[a])
+firm_assignee_firms = np.array(firm_assignee_firms, dtype=np.int64)
+firm_assignee_codes = encode('assignee', firm_assignee_ids)
+
+# go through the assignee - patent connector and pair every patent of a relevant assignee
+# with each ipo that assignee is an alias of
 print('INGESTING PATENT ASSIGNEES\n')
-assignee_patent_id_set = {}
-for pa in patent_assignee:
-    patent_id = pa['patent_id'].strip()
-    assignee_id = pa['assignee_id'].strip()
-
-    if assignee_id in all_assignee_ids:
-        if assignee_id in assignee_patent_id_set:
-            assignee_patent_id_set[assignee_id].add(patent_id)
-        else:
-            assignee_patent_id_set[assignee_id] = {patent_id}
-
-# go through the ipo with patent and perform actions
+keep = firm_assignee_codes != MISSING
+firm_assignee_firms = firm_assignee_firms[keep]
+firm_assignee_codes = firm_assignee_codes[keep]
+order = np.argsort(firm_assignee_codes, kind='stable')
+firm_assignee_firms = firm_assignee_firms[order]
+assignee_firm_cnt = np.bincount(firm_assignee_codes, minlength=len(load_ids('assignee')))
+assignee_firm_start = np.cumsum(assignee_firm_cnt) - assignee_firm_cnt
+
+keep = patent_assignee_assignees != MISSING
+keep[keep] = assignee_firm_cnt[patent_assignee_assignees[keep]] > 0
+relevant_assignees = patent_assignee_assignees[keep]
+repeats = assignee_firm_cnt[relevant_assignees]
+# position of every pair among the firms of its assignee
+nth = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+pair_firms = firm_assignee_firms[np.repeat(assignee_firm_start[relevant_assignees], repeats) +
+                                 nth]
+pair_patents = np.repeat(patent_assignee_patents[keep], repeats)
+
+# bucket the pairs by grant year, and by application year for the patents counted by grant
+# year (the firm_year_patentcnt_REVISED.csv panel, only for the firms with such patents)
 print('STARTING COMPUTATION PROCESS\n')
-for ipo, alias_set in ipo_alias.items():
-    start_date = int(ipo_start_dates[ipo])
-
-    # generate "buckets" for every year from start date to 2016
-    year_patents = {}
-    for year in range(start_date, 2021):  # REMEMBER TO CHANGE THIS BACK TO 2017
-        year_patents[year] = set()  # starting with an empty set per patent
-
-    # iterate through alias set finding patents
-    for a in alias_set:
-        # get set of patent_id for this assignee_alias
-        a_id = assignee_name_id[a]
-        p_id_set = assignee_patent_id_set[a_id]
-
-        # iterate through the patent_id set and get patent dates
-        for p_id in p_id_set:
-            # TODO: HERE TO ACCESS MORE INFORMATION ABOUT THE PATENT
-            p_year = patent_id_year[p_id]
-
-            # patent year may be too recent or too early (from incorrect matching)
-            # skip this patent_id if so
-            if p_year > 2016 or p_year < start_date:
-                continue
-
-            # add this patent id to the relevant bucket
-            year_patents[p_year].add(p_id)
-
-    # write the information into the output file
-    for year, patent_id_set in year_patents.items():
-        row = [ipo, year, len(patent_id_set), '; '.join(patent_id_set)]
-        firm_year_patentcnt.writerow(row)
+grant_years = dates.grant_year[pair_patents]
+app_years = dates.app_year[pair_patents]
+granted = in_years(pair_firms, grant_years, first_years, args.last_patent_year)
+app_years[~granted] = MISSING
+firms_granted = np.bincount(pair_firms[granted], minlength=len(ipo_firms)) > 0
+
+by_grant_year = bucket_patents(pair_firms, pair_patents, grant_years, first_years,
+                               args.last_year, args.last_patent_year)
+by_app_year = bucket_patents(pair_firms, pair_patents, app_years, first_years,
+                             args.last_patent_year)
+
+# write the information into the output files
+patent_ids = load_ids('patent')
+header = ['ipo_firm', 'year', 'patent_cnt', 'patent_ids']
+with open('../outputs/firm_year_patentcnt.csv', 'w', newline="\n",
+          encoding='utf-8-sig') as output:
+    firm_year_patentcnt = csv.writer(output, delimiter=',')
+    firm_year_patentcnt.writerow(header)
+    firm_year_patentcnt.writerows(by_grant_year.rows(ipo_firms, patent_ids))
+
+with open('../outputs/firm_year_patentcnt_REVISED.csv', 'w', newline="\n",
+          encoding='utf-8-sig') as output:
+    fyp_2 = csv.writer(output, delimiter=',')
+    fyp_2.writerow(header)
+    fyp_2.writerows(by_app_year.rows(ipo_firms, patent_ids, firms_granted))
 
 
 # END OF PROCESS ##
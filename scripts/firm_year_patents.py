@@ -3,168 +3,254 @@
 """
 Firm + Year to Patents
 
-This script aggregates all backward and forward citations for each patent 
+This script aggregates all backward and forward citations for each patent
 and firm in firm_year_patentcnt.
 
 The file produced is outputs/firm_year_patents.csv, with header:
     ipo_firm, assignee_patent, patent_id, date_patent, assignee_citation,
     citation_id, date_citation, subsection_id, group_id, sequence, citation_type
-    
+
 *Note: citation_type is 0 for backward citations and 1 for forward citations
 
+Usage: python firm_year_patents.py [--stream]
+    --stream reads the TSVs in one pass each and only keeps the lookups of
+    the IPO firms' patents and their citations, instead of the cached
+    columns and citation graph of the whole corpus. The output file is the
+    same.
+
 @author: Audrey Yang (auyang@seas.upenn.edu)
 """
 
+import argparse
 import time
 import csv
-
-print('***\nBEGIN PROCESS')
-start_time = time.ctime()
-
-# Load patent_assignee
-patent_assignee_file = open('../patent_data/patent_assignee.tsv', 
-                            encoding='utf-8-sig')
-patent_assignee = csv.DictReader(patent_assignee_file, delimiter='\t')
-
-# Create patent to assignee dictionary
-print('Creating patent to assignee dict\n...')
-patent_to_assignee = {}
-for row in patent_assignee:
-    patent_to_assignee[row['patent_id']] = row['assignee_id']
-
-# Load cpc_current
-cpc_current_file = open('../patent_data/cpc_current.tsv', 
-                            encoding='utf-8-sig')
-cpc_current = csv.DictReader(cpc_current_file, delimiter='\t')
-
-# Create patent to subsection_id and sequence dictionary
-print('Creating subsection dict\n...') 
-patent_to_subsection = {}
-for row in cpc_current:
-    lst = patent_to_subsection.get(row['patent_id'], [])
-    lst.append([row['subsection_id'], row['group_id'], row['sequence']])
-    patent_to_subsection[row['patent_id']] = lst
-
-# Load application
-app_file = open('../patent_data/application.tsv', 
-                        encoding='utf-8-sig')
-application = csv.DictReader(app_file, delimiter='\t') 
-    
-# Create patent to year dictionary
-print('Creating year dict and application to patent dict\n...')
-patent_to_year = {}
-app_to_patent = {}
-for row in application:
-    patent_to_year[row['patent_id']] = int(row['date'][:4])
-    app_to_patent[row['number'][5:]] = row['patent_id']
-
-# Load uspatentcitation
-uspatentcitation_file = open('../patent_data/uspatentcitation.tsv', 
-                            encoding='utf-8-sig')
-uspatentcitation = csv.DictReader(uspatentcitation_file, delimiter='\t')
+import numpy as np
+from tsv_reader import read_batches, read_rows
+from app_number_index import app_number_index, search
+from citation_graph import load_graph
+from cpc_index import load_cpc
+from id_codes import MISSING, encode, get, load_codes, load_ids, lookup_table
 
 # Year range (for forward citations)
 year_range = 7
 
-# Create patent to citation dictionary, fw and bk
-print('Creating patent citations dict\n...')
-patent_to_citationbk = {}
-patent_to_citationfw = {}
-for row in uspatentcitation:
-    # Adding to backward citations
-    lstbk = patent_to_citationbk.get(row['patent_id'], [])
-    lstbk.append(row['citation_id'])
-    patent_to_citationbk[row['patent_id']] = lstbk
-    
-    # Adding to forward citations
-    if row['date']:
-        if (patent_to_year.get(row['patent_id'], 20000) - 
-                patent_to_year.get(row['citation_id'], 0)) <= year_range:
-            lstfw = patent_to_citationfw.get(row['citation_id'], [])
-            lstfw.append(row['patent_id'])
-            patent_to_citationfw[row['citation_id']] = lstfw
-
-# Load usapplicationcitation
-usappcitation_file = open('../patent_data/usapplicationcitation.tsv', 
-                                encoding='utf-8-sig')
-usappcitation = csv.DictReader(usappcitation_file, delimiter='\t')
-
-# Add application citations
-print('Adding application citation\n...')
-for row in usappcitation:
-    if row['date']:
-        cit = app_to_patent.get(row['number'][5:])
-        if cit and (patent_to_year.get(row['patent_id'], 20000) - 
-                patent_to_year.get(cit, 0)) <= year_range:
-            lstfw = patent_to_citationfw.get(cit, [])
-            lstfw.append(row['patent_id'])
-            patent_to_citationfw[cit] = lstfw
-
-# Load Kenneth table
-firm_year_patentcnt_file = open('../outputs/firm_year_patentcnt_REVISED.csv', 
-                            encoding='utf-8-sig')
-firm_year_patentcnt = csv.DictReader(firm_year_patentcnt_file, delimiter=',')
-
-# Write to output file
-with open('../outputs/firm_year_patents.csv', 'w', 
-              newline="\n", encoding='utf-8-sig') as output_file:
-    output = csv.writer(output_file, delimiter=',')
-    header = ['ipo_firm', 
-              'assignee_patent', 
-              'patent_id', 
-              'date_patent',
-              'assignee_citation',
-              'citation_id', 
-              'date_citation', 
-              'subsection_id', 
-              'group_id',
-              'sequence', 
-              'citation_type',
-              ]
-    output.writerow(header)
-    
+na = ['N/A', 'N/A', 'N/A']
+
+
+def output_row(ipo_firm, assignee, patent, year, cit_assignee, cit, cit_year,
+               sec, citation_type):
+    design = cit[0] == 'D'
+    return [ipo_firm,
+            assignee,
+            patent,
+            year,
+            cit_assignee,
+            cit,
+            cit_year,
+            'Design' if design else sec[0],
+            'Design' if design else sec[1],
+            0 if design else sec[2],
+            citation_type]
+
+
+def indexed_rows(firm_year_patentcnt):
+    """Output rows, looked up in the cached columns and citation graph."""
+    # Patents and assignees are handled as int codes (see id_codes.py), the
+    # per-patent lookups are arrays indexed by patent code
+    patents = load_ids('patent')
+    assignees = load_ids('assignee')
+
+    # Create patent to assignee table
+    print('Creating patent to assignee table\n...')
+    patent_to_assignee = lookup_table(
+            'patent',
+            load_codes('../patent_data/patent_assignee.tsv', 'patent_id'),
+            load_codes('../patent_data/patent_assignee.tsv', 'assignee_id',
+                       'assignee'))
+
+    # Load the subsection_id, group_id and sequence of every patent (built
+    # once, then memory-mapped)
+    cpc = load_cpc()
+
+    # Load the citation graph (built once, then memory-mapped)
+    graph = load_graph()
+
+    # Application year table
+    patent_to_year = graph.year
+
+    def assignee_of(patent):
+        """Assignee id of a patent code, 'N/A' if it has none."""
+        assignee = get(patent_to_assignee, patent)
+        if assignee is None:
+            return 'N/A'
+        return assignees[assignee]
+
+    print('Writing to output file\n...')
+    for firm, year, patent_cnt, patent_ids in firm_year_patentcnt:
+        if int(patent_cnt) > 0:
+            patent_ids = patent_ids.split('; ')
+            for patent, code in zip(patent_ids,
+                                    encode('patent', patent_ids).tolist()):
+                assignee = assignee_of(code)
+
+                # Writing backward citation (citation_type = 0)
+                for cit in graph.backward(code).tolist():
+                    for sec in cpc.entries(cit) or [na]:
+                        yield output_row(
+                                firm, assignee, patent, year,
+                                assignee_of(cit), patents[cit],
+                                get(patent_to_year, cit), sec, 0)
+
+                # Writing forward citation (citation_type = 1)
+                for cit in graph.forward(code, year_range).tolist():
+                    for sec in cpc.entries(cit) or [na]:
+                        yield output_row(
+                                firm, assignee, patent, year,
+                                assignee_of(cit), patents[cit],
+                                get(patent_to_year, cit), sec, 1)
+
+
+def streamed_rows(firm_year_patentcnt):
+    """
+    Output rows, looked up in dicts that only hold the IPO firms' patents
+    and the patents they cite or are cited by.
+    """
+    ipo_patents = {patent
+                   for firm, year, patent_cnt, patent_ids in firm_year_patentcnt
+                   if int(patent_cnt) > 0
+                   for patent in patent_ids.split('; ')}
+
+    # Application numbers of every patent, resolving to the position of the
+    # patent in ipo_list or MISSING if it is not an IPO patent (the last row
+    # of a number wins, as in the full application to patent dict)
+    print('Reading IPO patent applications\n...')
+    ipo_list = np.array(sorted(patent for patent in ipo_patents if patent),
+                        dtype=np.str_)
+    positions = np.arange(len(ipo_list), dtype=np.int32)
+    app_to_patent = app_number_index(
+            (batch['number'],
+             search(ipo_list, positions, batch['patent_id'], MISSING))
+            for batch in read_batches('../patent_data/application.tsv',
+                                      ['patent_id', 'number']))
+    ipo_list = ipo_list.tolist()
+
+    # Citations made by and made to the IPO patents
+    print('Reading IPO patent citations\n...')
+    patent_to_citationbk = {}
+    patent_to_citationfw = {}
+    for patent, cit, date in read_rows('../patent_data/uspatentcitation.tsv',
+                                       ['patent_id', 'citation_id', 'date']):
+        if patent in ipo_patents:
+            patent_to_citationbk.setdefault(patent, []).append(cit)
+        if date and cit in ipo_patents:
+            patent_to_citationfw.setdefault(cit, []).append(patent)
+
+    for batch in read_batches('../patent_data/usapplicationcitation.tsv',
+                              ['patent_id', 'date', 'number']):
+        cited = app_to_patent.resolve(batch['number'])
+        keep = (batch['date'] != '') & (cited != MISSING)
+        for patent, cit in zip(batch['patent_id'][keep].tolist(),
+                               cited[keep].tolist()):
+            patent_to_citationfw.setdefault(ipo_list[cit], []).append(patent)
+
+    reachable = set(ipo_patents)
+    for citations in (patent_to_citationbk, patent_to_citationfw):
+        for lst in citations.values():
+            reachable.update(lst)
+
+    # Lookups of the reachable patents
+    print('Reading years, assignees and subsections\n...')
+    patent_to_year = {}
+    for patent, date in read_rows('../patent_data/application.tsv',
+                                  ['patent_id', 'date']):
+        if patent in reachable:
+            patent_to_year[patent] = int(date[:4])
+
+    patent_to_assignee = {}
+    for patent, assignee in read_rows('../patent_data/patent_assignee.tsv',
+                                      ['patent_id', 'assignee_id']):
+        if patent in reachable:
+            patent_to_assignee[patent] = assignee
+
+    patent_to_subsection = {}
+    for patent, subsection, group, sequence in read_rows(
+            '../patent_data/cpc_current.tsv',
+            ['patent_id', 'subsection_id', 'group_id', 'sequence']):
+        if patent in reachable:
+            patent_to_subsection.setdefault(patent, []).append(
+                    [subsection, group, sequence])
+
     print('Writing to output file\n...')
-    na = ['N/A', 'N/A', 'N/A']
-    for row in firm_year_patentcnt:
-        if int(row['patent_cnt']) > 0:
-            for patent in row['patent_ids'].split('; '):
+    for firm, year, patent_cnt, patent_ids in firm_year_patentcnt:
+        if int(patent_cnt) > 0:
+            for patent in patent_ids.split('; '):
+                assignee = patent_to_assignee.get(patent, 'N/A')
+
                 # Writing backward citation (citation_type = 0)
                 for cit in patent_to_citationbk.get(patent, []):
                     for sec in patent_to_subsection.get(cit, [na]):
-                        output.writerow([
-                                row['ipo_firm'], 
-                                patent_to_assignee.get(patent, 'N/A'), 
-                                patent,
-                                row['year'],
-                                patent_to_assignee.get(cit, 'N/A'), 
-                                cit,
-                                patent_to_year.get(cit),
-                                'Design' if cit[0] == 'D' else sec[0],
-                                'Design' if cit[0] == 'D' else sec[1],
-                                0 if cit[0] == 'D' else sec[2],
-                                0
-                            ]) 
-                
+                        yield output_row(
+                                firm, assignee, patent, year,
+                                patent_to_assignee.get(cit, 'N/A'), cit,
+                                patent_to_year.get(cit), sec, 0)
+
                 # Writing forward citation (citation_type = 1)
                 for cit in patent_to_citationfw.get(patent, []):
+                    if (patent_to_year.get(cit, 20000) -
+                            patent_to_year.get(patent, 0)) > year_range:
+                        continue
                     for sec in patent_to_subsection.get(cit, [na]):
-                        output.writerow([
-                                row['ipo_firm'], 
-                                patent_to_assignee.get(patent, 'N/A'), 
-                                patent,
-                                row['year'],
-                                patent_to_assignee.get(cit, 'N/A'), 
-                                cit,
-                                patent_to_year.get(cit),
-                                'Design' if cit[0] == 'D' else sec[0],
-                                'Design' if cit[0] == 'D' else sec[1],
-                                0 if cit[0] == 'D' else sec[2],
-                                1
-                            ])
-
-print('***\nEND OF PROCESS')
-end_time = time.ctime()
-
-print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
-    
\ No newline at end of file
+                        yield output_row(
+                                firm, assignee, patent, year,
+                                patent_to_assignee.get(cit, 'N/A'), cit,
+                                patent_to_year.get(cit), sec, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Backward and forward citations of the IPO patents.')
+    parser.add_argument('--stream', action='store_true',
+                        help='only read the lookups of the IPO patents')
+    args = parser.parse_args()
+
+    print('***\nBEGIN PROCESS')
+    start_time = time.ctime()
+
+    # Load Kenneth table (one row per IPO firm and year)
+    firm_year_patentcnt = list(read_rows(
+            '../outputs/firm_year_patentcnt_REVISED.csv',
+            ['ipo_firm', 'year', 'patent_cnt', 'patent_ids'], delimiter=','))
+
+    if args.stream:
+        rows = streamed_rows(firm_year_patentcnt)
+    else:
+        rows = indexed_rows(firm_year_patentcnt)
+
+    # Write to output file, row by row as they are produced
+    with open('../outputs/firm_year_patents.csv', 'w',
+                  newline="\n", encoding='utf-8-sig') as output_file:
+        output = csv.writer(output_file, delimiter=',')
+        header = ['ipo_firm',
+                  'assignee_patent',
+                  'patent_id',
+                  'date_patent',
+                  'assignee_citation',
+                  'citation_id',
+                  'date_citation',
+                  'subsection_id',
+                  'group_id',
+                  'sequence',
+                  'citation_type',
+                  ]
+        output.writerow(header)
+        output.writerows(rows)
+
+    print('***\nEND OF PROCESS')
+    end_time = time.ctime()
+
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
+
+
+if __name__ == '__main__':
+    main()
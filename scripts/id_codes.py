@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Integer ID Codes
+
+Maps the PatentsView patent, assignee, inventor and location IDs to dense
+int32 codes shared by every script, so that per-patent lookups can be NumPy
+arrays indexed by code (year[code]) instead of dicts keyed by ID strings.
+
+The code of an ID is its position in the sorted list of every ID of that
+kind found in the source columns below (the empty ID has no code). The
+lists are saved once in ../patent_data/.cache/ids/ and rebuilt (together
+with the code columns encoded from them) when one of the source TSVs
+changes.
+
+    from id_codes import get, load_codes, load_ids, lookup_table, take
+    patents = load_ids('patent')         # code -> patent id
+    app_patent = load_codes('../patent_data/application.tsv', 'patent_id')
+    year = lookup_table('patent', app_patent, application['date'])
+    take(year, codes, 20000)             # [.get(patent, 20000) for ...]
+    get(year, code, 'N/A')               # .get(patent, 'N/A')
+"""
+
+import json
+import os
+
+import numpy as np
+
+from tsv_cache import cache_dir, load_columns, source_stamp, temp_path
+
+IDS_DIR = '../patent_data/.cache/ids'
+
+# value of a lookup table entry that was never set
+MISSING = -1
+
+# kind -> TSV columns holding IDs of that kind
+SOURCES = {
+    'patent': [
+        ('../patent_data/patent.tsv', 'number'),
+        ('../patent_data/application.tsv', 'patent_id'),
+        ('../patent_data/patent_assignee.tsv', 'patent_id'),
+        ('../patent_data/patent_inventor.tsv', 'patent_id'),
+        ('../patent_data/cpc_current.tsv', 'patent_id'),
+        ('../patent_data/uspatentcitation.tsv', 'patent_id'),
+        ('../patent_data/uspatentcitation.tsv', 'citation_id'),
+        ('../patent_data/usapplicationcitation.tsv', 'patent_id'),
+    ],
+    'assignee': [
+        ('../patent_data/assignee.tsv', 'id'),
+        ('../patent_data/patent_assignee.tsv', 'assignee_id'),
+    ],
+    'inventor': [
+        ('../patent_data/inventor.tsv', 'id'),
+        ('../patent_data/patent_inventor.tsv', 'inventor_id'),
+    ],
+    'location': [
+        ('../patent_data/location.tsv', 'id'),
+        ('../patent_data/patent_assignee.tsv', 'location_id'),
+        ('../patent_data/patent_inventor.tsv', 'location_id'),
+    ],
+}
+
+# kind -> sorted ids, loaded once per process
+loaded_ids = {}
+
+
+def sources_stamp(kind):
+    """Modification time and size of every (existing) source of a kind."""
+    return {path: source_stamp(path) for path, _ in SOURCES[kind]
+            if os.path.isfile(path)}
+
+
+def load_ids(kind):
+    """Returns the sorted array of every ID of a kind (code -> ID)."""
+    if kind in loaded_ids:
+        return loaded_ids[kind]
+
+    os.makedirs(IDS_DIR, exist_ok=True)
+    ids_path = os.path.join(IDS_DIR, kind + '.npy')
+    meta_path = os.path.join(IDS_DIR, kind + '.json')
+    stamp = sources_stamp(kind)
+
+    meta = None
+    if os.path.isfile(meta_path) and os.path.isfile(ids_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        print('Building ' + kind + ' id codes\n...')
+        columns = [load_columns(path, [column])[column]
+                   for path, column in SOURCES[kind] if path in stamp]
+        ids = np.unique(np.concatenate(columns))
+        # an empty ID is no ID, it encodes to MISSING
+        if len(ids) and ids[0] == '':
+            ids = ids[1:]
+        with open(temp_path(ids_path), 'wb') as ids_file:
+            np.save(ids_file, ids)
+        os.replace(temp_path(ids_path), ids_path)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+
+    loaded_ids[kind] = np.load(ids_path, mmap_mode='r')
+    return loaded_ids[kind]
+
+
+def encode(kind, values):
+    """Returns the int32 codes of an array/list of IDs (MISSING if unknown)."""
+    ids = load_ids(kind)
+    values = np.asarray(values, dtype=np.str_)
+    codes = np.searchsorted(ids, values).astype(np.int32)
+    found = codes < len(ids)
+    found[found] = ids[codes[found]] == values[found]
+    codes[~found] = MISSING
+    return codes
+
+
+def load_codes(path, column, kind='patent'):
+    """
+    Returns the codes of a TSV column of IDs, cached next to the column and
+    re-encoded when the TSV or the ID list changes.
+    """
+    load_ids(kind)
+    name = column + '-' + kind + '_code'
+    codes_path = os.path.join(cache_dir(path), name + '.npy')
+    meta_path = os.path.join(cache_dir(path), name + '.json')
+    stamp = {'source': source_stamp(path),
+             'ids': source_stamp(os.path.join(IDS_DIR, kind + '.npy'))}
+
+    meta = None
+    if os.path.isfile(meta_path) and os.path.isfile(codes_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        codes = encode(kind, load_columns(path, [column])[column])
+        with open(temp_path(codes_path), 'wb') as codes_file:
+            np.save(codes_file, codes)
+        os.replace(temp_path(codes_path), codes_path)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+    return np.load(codes_path, mmap_mode='r')
+
+
+def lookup_table(kind, codes, values, dtype=np.int32):
+    """
+    Builds a table indexed by code with table[codes[i]] = values[i]. Like a
+    dict, the last value of a repeated code wins; unset entries are MISSING.
+    """
+    table = np.full(len(load_ids(kind)), MISSING, dtype=dtype)
+    codes = np.asarray(codes)
+    values = np.asarray(values)
+    # keep the last occurrence of every code
+    last_codes, first_in_reversed = np.unique(codes[::-1], return_index=True)
+    last = len(codes) - 1 - first_in_reversed
+    keep = last_codes != MISSING
+    table[last_codes[keep]] = values[last[keep]]
+    return table
+
+
+def take(table, codes, default):
+    """table[codes] with default where the code or the entry is MISSING."""
+    codes = np.asarray(codes)
+    values = table[codes]
+    values[(codes == MISSING) | (values == MISSING)] = default
+    return values
+
+
+def get(table, code, default=None):
+    """table[code] for one code, or default if the code or entry is MISSING."""
+    if code == MISSING:
+        return default
+    value = table[code]
+    if value == MISSING:
+        return default
+    return value
@@ -3,110 +3,71 @@
 """
 Inventor Foward Citation Count
 
-This script counts the forward citations per patent for 4 different year 
-ranges. The year ranges are 4, 5, and 7 years after the publication year 
-of the patent.
+This script counts the forward citations per inventor and application year
+for different year ranges. The year ranges are 4, 5, and 7 years after the
+publication year of the patent by default (counted with
+forward_citations.py). The citations are the forward citations of the
+inventors' patents, taken straight from the citation graph by the
+ForwardCounts reducer (inventor_reducers.py) over the inventor partition
+(inventor_partition.py).
 
 Ths file produced is outputs/inventor_forward_citation_cnt.csv, which has the header:
     inventor, year, forward_cnt4, forward_cnt5, forward_cnt7.
 
+Usage: python inventor_forward_citation_cnt.py [--windows 4 5 7 ...]
+
 @author: Audrey Yang (auyang@seas.upenn.edu)
 """
 
+import argparse
 import time
-import csv
+from citation_graph import load_graph
+from forward_citations import WINDOWS
+from inventor_partition import load_partition, write_scan
+from inventor_reducers import ForwardCounts
+
+this_year = 2021
 
-print('***\nBEGIN PROCESS')
-start_time = time.ctime()
+# Year range of the forward citations in inventor_year_patents_fw
+year_range = 7
 
-# Load in citations_forward_backward.csv
-citations_file = open('../outputs/inventor_year_patents_fw.csv', 
-                      encoding='utf-8-sig')
-citations = csv.DictReader(citations_file, delimiter=',')
+output_path = '../outputs/inventor_forward_citation_cnt.csv'
+
+
+def forward_count_reducer(partition, windows):
+    """The ForwardCounts reducer for the sorted windows."""
+    # Load the citation graph (built once, then memory-mapped)
+    graph = load_graph()
+    return ForwardCounts(partition, graph, windows, this_year,
+                         max(year_range, windows[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Forward citation counts per inventor and year.')
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS,
+                        help='year ranges to count (default 4 5 7)')
+    args = parser.parse_args()
+    windows = sorted(args.windows)
+
+    print('***\nBEGIN PROCESS')
+    start_time = time.ctime()
+
+    # Load inventor_patent, grouped by inventor (built once, then
+    # memory-mapped)
+    partition = load_partition()
+    reducer = forward_count_reducer(partition, windows)
+
+    # Create output file
+    print('WRITING TO FILE\n...')
+    write_scan(partition, [reducer], [output_path])
+
+    print('***\nEND OF PROCESS')
+    end_time = time.ctime()
+
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
 
-this_year = 2021
 
-# Create output file
-print('WRITING TO FILE\n...')
-with open('../outputs/inventor_forward_citation_cnt.csv', 'w', 
-          newline='\n', encoding='utf-8-sig') as output_file:
-    output = csv.writer(output_file, delimiter=',')
-    header = ['inventor', 'year', 'forward_cnt4', 'forward_cnt5', 
-              'forward_cnt7']
-    output.writerow(header)
-
-    # Keep track of current state 
-    last_year = 0
-    last_inventor = ''
-    last_patent = ''
-    count4, count5, count7 = 0, 0, 0
-    
-    for row in citations: 
-        if not row['app_year'].isnumeric():
-            continue        
-        if not (int(row['app_year']) == last_year and 
-                row['inventor_id'] == last_inventor):
-            # Write to file
-            if last_year:
-                if last_year > this_year - 4: 
-                    output.writerow([
-                            last_inventor, 
-                            last_year, 
-                            'N/A',
-                            'N/A',
-                            'N/A'
-                        ])
-                elif last_year > this_year - 5: 
-                    output.writerow([
-                            last_inventor, 
-                            last_year, 
-                            count4,
-                            'N/A',
-                            'N/A'
-                        ])
-                elif last_year > this_year - 7:
-                    output.writerow([
-                            last_inventor, 
-                            last_year, 
-                            count4, 
-                            count5,
-                            'N/A'
-                        ])
-                else:
-                    output.writerow([
-                            last_inventor, 
-                            last_year, 
-                            count4, 
-                            count5,
-                            count7
-                        ])
-
-            # Reset + update
-            last_year = int(row['app_year'])
-            last_inventor = row['inventor_id']
-            count4, count5, count7 = 0, 0, 0
-            
-        curr = int(row['citation_app_year']) if (not 
-                  row['citation_app_year'] == 'N/A') else 20000
-        if curr - last_year <= 4:
-            count4 += 1
-        if curr - last_year <= 5:
-            count5 += 1
-        if curr - last_year <= 7:
-            count7 += 1   
-    
-    # Write last thing            
-    if last_year:
-        output.writerow([
-                last_inventor, 
-                last_year, 
-                count4, 
-                count5,
-                count7
-            ])
-        
-print('***\nEND OF PROCESS')
-end_time = time.ctime()
-
-print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
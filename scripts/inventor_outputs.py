@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventor Outputs
+
+Writes inventor_timeline.csv, inventor_year_dominant_firm.csv and
+inventor_forward_citation_cnt.csv with one scan of the inventor partition
+(inventor_partition.py) instead of one per script. The files are the same as
+the ones of inventor_firm_range.py, inventor_year_dominant_firm.py and
+inventor_forward_citation_cnt.py, so it needs the inputs of all three.
+
+Usage: python inventor_outputs.py [--workers N] [--windows 4 5 7 ...]
+
+@author: Audrey Yang (auyang@seas.upenn.edu)
+"""
+
+import argparse
+import time
+import inventor_firm_range
+import inventor_year_dominant_firm
+import inventor_forward_citation_cnt
+from forward_citations import WINDOWS
+from inventor_partition import load_partition, write_scan
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='All per-inventor outputs in one scan.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes scanning inventors (default 1)')
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS,
+                        help='forward citation year ranges (default 4 5 7)')
+    args = parser.parse_args()
+    windows = sorted(args.windows)
+
+    print('***\nBEGIN PROCESS')
+    start_time = time.ctime()
+
+    # Load inventor_patent, grouped by inventor (built once, then
+    # memory-mapped)
+    partition = load_partition()
+    reducers = [
+        inventor_firm_range.firm_range_reducer(partition),
+        inventor_year_dominant_firm.dominant_firm_reducer(partition),
+        inventor_forward_citation_cnt.forward_count_reducer(partition, windows),
+    ]
+    paths = [
+        inventor_firm_range.output_path,
+        inventor_year_dominant_firm.output_path,
+        inventor_forward_citation_cnt.output_path,
+    ]
+
+    # Create output files
+    print('WRITING TO FILES\n')
+    write_scan(partition, reducers, paths, args.workers)
+
+    print('***\nEND OF PROCESS')
+    end_time = time.ctime()
+
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventor Partitioned Patents
+
+The rows of outputs/inventor_patent.csv grouped by inventor, persisted as
+arrays with an offset index, so every per-inventor output is a reducer over
+the same scan instead of its own pass over the CSV:
+
+    from inventor_partition import load_partition, write_scan
+    partition = load_partition()
+    partition.rows(k)               # slice of the rows of inventor k
+    partition.inventor_ids[k]       # its inventor_id
+    partition.patents[partition.rows(k)]
+
+Per row (grouped by inventor, each inventor's rows in file order):
+    patents   - patent code (see id_codes.py)
+    assignees - assignee code, an index into assignee_ids (numbered in
+                order of appearance, so 'N/A' is an assignee like any other)
+    years     - application year of the patent (MISSING if unknown)
+Inventors are numbered in order of appearance, inventor k's rows are
+offsets[k]:offsets[k + 1].
+
+The arrays are built once into ../outputs/.cache/inventor_partition/ and
+memory-mapped afterwards. They are rebuilt when inventor_patent.csv,
+application.tsv or the patent codes change.
+
+A reducer has a header, start_chunk(lo, hi), called before a chunk of
+inventors with the partition rows lo to hi - 1, and rows(k, lo, hi), the
+CSV rows of inventor k from its partition rows lo to hi - 1 (see
+inventor_reducers.py). write_scan() runs any number of reducers over one
+scan of the inventors, one output file each, in chunks of at most about
+CHUNK_ROWS rows, optionally split over a process pool.
+"""
+
+import csv
+import io
+import json
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+from date_table import load_dates
+from id_codes import IDS_DIR, MISSING, encode, take
+from tsv_cache import source_stamp, temp_path, write_array
+from tsv_reader import read_rows
+
+PARTITION_DIR = '../outputs/.cache/inventor_partition'
+
+INVENTOR_PATENT = '../outputs/inventor_patent.csv'
+
+# partition rows of a chunk of the scan (more for a single big inventor)
+CHUNK_ROWS = 1000000
+
+SOURCES = [
+    INVENTOR_PATENT,
+    '../patent_data/application.tsv',
+    os.path.join(IDS_DIR, 'patent.npy'),
+]
+
+ARRAYS = ['inventor_ids', 'offsets', 'patents', 'assignees', 'assignee_ids',
+          'years']
+
+
+class InventorPartition:
+    """Memory-mapped inventor_patent rows, grouped by inventor."""
+
+    def __init__(self, directory=PARTITION_DIR):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'),
+                                        mmap_mode='r'))
+
+    def __len__(self):
+        """Number of inventors."""
+        return len(self.offsets) - 1
+
+    def rows(self, k):
+        """Slice of the rows of inventor k."""
+        return slice(int(self.offsets[k]), int(self.offsets[k + 1]))
+
+
+def group_by_inventor(inventors, size):
+    """
+    Returns (order, offsets): order sorts the rows by inventor code, keeping
+    the file order of each inventor's rows, and the rows of inventor k are
+    order[offsets[k]:offsets[k + 1]].
+    """
+    inventors = np.asarray(inventors, dtype=np.int64)
+    order = np.argsort(inventors, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(inventors, minlength=size), out=offsets[1:])
+    return order, offsets
+
+
+def build_partition(directory):
+    """Builds the partition arrays from inventor_patent.csv."""
+    print('Building inventor partition\n...')
+    inventor_codes = {}
+    assignee_codes = {}
+    inventors, patents, assignees = [], [], []
+    for inventor, patent, assignee in read_rows(
+            INVENTOR_PATENT, ['inventor_id', 'patent_id', 'assignee_id'],
+            delimiter=','):
+        inventors.append(inventor_codes.setdefault(inventor,
+                                                   len(inventor_codes)))
+        assignees.append(assignee_codes.setdefault(assignee,
+                                                   len(assignee_codes)))
+        patents.append(patent)
+    patents = encode('patent', patents)
+
+    patent_to_year = load_dates().app_year
+
+    order, offsets = group_by_inventor(inventors, len(inventor_codes))
+    write_array(directory, 'inventor_ids',
+                np.array(list(inventor_codes), dtype=np.str_))
+    write_array(directory, 'offsets', offsets)
+    write_array(directory, 'patents', patents[order])
+    write_array(directory, 'assignees',
+                np.array(assignees, dtype=np.int32)[order])
+    write_array(directory, 'assignee_ids',
+                np.array(list(assignee_codes), dtype=np.str_))
+    write_array(directory, 'years',
+                take(patent_to_year, patents, MISSING)[order])
+
+
+def load_partition(directory=PARTITION_DIR):
+    """Returns the inventor partition, (re)building it if it is out of date."""
+    stamp = {path: source_stamp(path) for path in SOURCES}
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+
+    if meta != stamp:
+        build_partition(directory)
+        with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+            json.dump(stamp, meta_file)
+        os.replace(temp_path(meta_path), meta_path)
+
+    return InventorPartition(directory)
+
+
+def init_worker(offsets, reducers):
+    # every worker gets its own copy of the reducers
+    global worker_offsets, worker_reducers
+    worker_offsets = offsets
+    worker_reducers = reducers
+
+
+def scan_chunk(bounds):
+    """
+    CSV rows of every reducer for the inventors bounds[0] to bounds[1] - 1,
+    as one text per reducer.
+    """
+    for reducer in worker_reducers:
+        reducer.start_chunk(int(worker_offsets[bounds[0]]),
+                            int(worker_offsets[bounds[1]]))
+    texts = [io.StringIO() for _ in worker_reducers]
+    outputs = [csv.writer(text, delimiter=',') for text in texts]
+    for k in range(*bounds):
+        lo, hi = int(worker_offsets[k]), int(worker_offsets[k + 1])
+        if lo == hi:
+            continue
+        for reducer, output in zip(worker_reducers, outputs):
+            output.writerows(reducer.rows(k, lo, hi))
+    return [text.getvalue() for text in texts]
+
+
+def write_scan(partition, reducers, paths, workers=1):
+    """
+    Writes the header and rows of each reducer to its path, in inventor
+    order, with one scan of the inventors in workers processes.
+    """
+    # Split the inventors into chunks of about the same number of patents,
+    # a few per worker, none much bigger than CHUNK_ROWS
+    inventor_cnt = len(partition)
+    row_cnt = int(partition.offsets[-1])
+    chunk_cnt = max(1, min(inventor_cnt,
+                           max(min(workers * 8, math.ceil(row_cnt / 10000)),
+                               math.ceil(row_cnt / CHUNK_ROWS))))
+    bounds = np.searchsorted(partition.offsets,
+                             np.linspace(0, row_cnt, chunk_cnt + 1))
+    bounds[-1] = inventor_cnt
+    chunks = [(lo, hi) for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+              if lo < hi]
+
+    output_files = [open(path, 'w', newline='\n', encoding='utf-8-sig')
+                    for path in paths]
+    try:
+        for reducer, output_file in zip(reducers, output_files):
+            csv.writer(output_file, delimiter=',').writerow(reducer.header)
+
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, init_worker,
+                                        (partition.offsets, reducers))
+            # imap hands the chunks back in order, which keeps the output
+            # deterministic
+            results = pool.imap(scan_chunk, chunks)
+        else:
+            pool = None
+            init_worker(partition.offsets, reducers)
+            results = map(scan_chunk, chunks)
+
+        for texts in results:
+            for output_file, text in zip(output_files, texts):
+                output_file.write(text)
+
+        if pool:
+            pool.close()
+            pool.join()
+    finally:
+        for output_file in output_files:
+            output_file.close()
+
+
+if __name__ == '__main__':
+    partition = load_partition()
+    print('inventors: ' + str(len(partition)))
+    print('patents:   ' + str(int(partition.offsets[-1])))
+    print('assignees: ' + str(len(partition.assignee_ids)))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventor Reducers
+
+Per-inventor outputs over the inventor partition (see inventor_partition.py),
+each with a header, start_chunk(lo, hi), called before the inventors of the
+partition rows lo to hi - 1 are scanned, and rows(k, lo, hi), the CSV rows
+of inventor k from its partition rows lo to hi - 1:
+
+    FirmRange     - inventor_timeline.csv: earliest and latest application
+                    year of the inventor's patents at every firm
+    DominantFirm  - inventor_year_dominant_firm.csv: the dominant firm of
+                    every year (see inventor_timeline.py)
+    ForwardCounts - inventor_forward_citation_cnt.csv: forward citations of
+                    the inventor's patents per application year (see
+                    forward_citations.py)
+
+The firms are given as a name per assignee code of the partition, so every
+script keeps its own name matching.
+"""
+
+import numpy as np
+
+from citation_graph import NO_YEAR, slices
+from id_codes import MISSING, take
+from forward_citations import window_counts, window_header, window_row
+from inventor_timeline import timeline
+
+
+def firm_codes(firm_names):
+    """
+    (code per assignee, firm names): the firm names of the assignees
+    numbered in order of appearance.
+    """
+    codes = {}
+    assignee_firms = [codes.setdefault(name, len(codes)) for name in firm_names]
+    return np.array(assignee_firms, dtype=np.int64), list(codes)
+
+
+class FirmRange:
+    """
+    [inventor_id, firm, earliest year, latest year] of every firm of an
+    inventor, in order of its first patent there (3000, 0 if none of them
+    has an application year).
+    """
+
+    header = ['inventor_id', 'assignee', 'earliest_date', 'latest_date']
+
+    def __init__(self, partition, firm_names):
+        assignee_firms, self.firm_names = firm_codes(firm_names)
+        self.inventor_ids = partition.inventor_ids
+        self.firms = assignee_firms[partition.assignees]
+        self.years = partition.years
+
+    def start_chunk(self, lo, hi):
+        pass
+
+    def rows(self, k, lo, hi):
+        year_ranges = {}
+        for firm, year in zip(self.firms[lo:hi].tolist(),
+                              self.years[lo:hi].tolist()):
+            rng = year_ranges.setdefault(firm, [3000, 0])
+            if year != MISSING:
+                if year < rng[0]:
+                    rng[0] = year
+                if year > rng[1]:
+                    rng[1] = year
+        inventor = str(self.inventor_ids[k])
+        return [[inventor, self.firm_names[firm]] + rng
+                for firm, rng in year_ranges.items()]
+
+
+class DominantFirm:
+    """
+    The timeline rows [inventor_id, year, dominant_assignee,
+    extrapolated_dominant_assignee, more_than_one, patented] of an inventor,
+    from the patents applied for before this_year (unknown years count as
+    this_year). granted maps an inventor to the app years (as str) of its
+    patents in inventor_year_patents_bk.csv.
+    """
+
+    header = ['inventor_id', 'year', 'dominant_assignee',
+              'extrapolated_dominant_assignee', 'more_than_one', 'patented']
+
+    def __init__(self, partition, firm_names, granted, this_year):
+        assignee_firms, self.firm_names = firm_codes(firm_names)
+        self.inventor_ids = partition.inventor_ids
+        self.firms = assignee_firms[partition.assignees]
+        self.years = np.array(partition.years)
+        self.years[self.years == MISSING] = this_year
+        self.granted = granted
+        self.this_year = this_year
+
+    def start_chunk(self, lo, hi):
+        pass
+
+    def rows(self, k, lo, hi):
+        years = self.years[lo:hi]
+        kept = years < self.this_year
+        if not kept.any():
+            return []
+        inventor = str(self.inventor_ids[k])
+        granted_years = self.granted.get(inventor, ())
+        rows = []
+        for year, dominant, extrapolated, more in timeline(
+                years[kept].tolist(), self.firms[lo:hi][kept].tolist(),
+                self.this_year):
+            has_granted_patent = int(str(year) in granted_years)
+            if dominant is not None:
+                dominant = self.firm_names[dominant]
+                rows.append([inventor, year, dominant, dominant, more,
+                             has_granted_patent])
+            else:
+                extrapolated = ('N/A' if extrapolated is None
+                                else self.firm_names[extrapolated])
+                rows.append([inventor, year, 'N/A', extrapolated, 0,
+                             has_granted_patent])
+        return rows
+
+
+class ForwardCounts:
+    """
+    [inventor, year, forward counts per window] of every application year
+    of an inventor's patents with forward citations within max_lag years
+    (in order of the first such patent). Patents without an application
+    year are left out.
+    """
+
+    def __init__(self, partition, graph, windows, this_year, max_lag):
+        self.header = ['inventor', 'year'] + window_header(windows)
+        self.inventor_ids = partition.inventor_ids
+        self.patents = partition.patents
+        self.years = partition.years
+        self.graph = graph
+        self.windows = windows
+        self.this_year = this_year
+        self.max_lag = max_lag
+        self.start_chunk(0, 0)
+
+    def start_chunk(self, lo, hi):
+        """
+        The lags of the forward citations within max_lag of the partition
+        rows lo to hi - 1, grouped by row as lags[lag_offsets[row - lo]:
+        lag_offsets[row - lo + 1]]. Only one chunk of rows is expanded at a
+        time, so the citations of the whole partition are never in memory.
+        """
+        patents = np.array(self.patents[lo:hi], dtype=np.int64)
+        years = self.years[lo:hi]
+        patents[years == MISSING] = MISSING
+        rows, positions = slices(self.graph.forward_offsets, patents)
+        citing = self.graph.forward_neighbors[positions]
+        lags = take(self.graph.year, citing, NO_YEAR) - years[rows]
+        kept = lags <= self.max_lag
+        self.chunk_lo = lo
+        self.lags = lags[kept]
+        self.lag_offsets = np.zeros(hi - lo + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[kept], minlength=hi - lo),
+                  out=self.lag_offsets[1:])
+
+    def rows(self, k, lo, hi):
+        lo_row, hi_row = lo - self.chunk_lo, hi - self.chunk_lo
+        lag_offsets = self.lag_offsets[lo_row:hi_row + 1]
+        start, end = lag_offsets[0], lag_offsets[-1]
+        if start == end:
+            return []
+        keys = np.repeat(self.years[lo:hi], np.diff(lag_offsets))
+        inventor = str(self.inventor_ids[k])
+        return [[inventor, year] + window_row(cnt, year, self.this_year,
+                                              self.windows)
+                for year, cnt in window_counts(
+                        keys.tolist(), self.lags[start:end],
+                        self.windows).items()]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventor Timeline Engine
+
+Builds the year by year timeline of inventor_year_dominant_firm.csv from one
+inventor's patents, given as the (application year, firm code) of each of
+its inventor_patent rows in file order (see the DominantFirm reducer in
+inventor_reducers.py).
+
+Every year from an inventor's first patent to this_year gets
+    dominant      - the firm with the most patents that year (the first one
+                    seen on ties), None in years without patents
+    extrapolated  - the dominant firm, or in years without patents the
+                    dominant firm of the last year with patents if that firm
+                    is dominant again in a later year
+    more_than_one - 1 if the inventor patented for more than one firm
+"""
+
+from operator import itemgetter
+
+
+def timeline(years, firms, this_year):
+    """
+    (year, dominant, extrapolated, more_than_one) of every year from the
+    first of the years to this_year, for the (year, firm) of each of one
+    inventor's patents.
+    """
+    # patents per firm and year, years and firms in order of first patent
+    year_firms = {}
+    for year, firm in zip(years, firms):
+        c = year_firms.setdefault(year, {})
+        c[firm] = c.get(firm, 0) + 1
+
+    # like Counter.most_common(1): max keeps the first of equal counts
+    dominant = {year: max(c.items(), key=itemgetter(1))[0]
+                for year, c in year_firms.items()}
+
+    # reverse scan: the last year each firm is dominant
+    last_dominant = {}
+    for year in sorted(dominant, reverse=True):
+        last_dominant.setdefault(dominant[year], year)
+
+    rows = []
+    carried = None
+    for year in range(min(year_firms), this_year + 1):
+        if year in dominant:
+            firm = dominant[year]
+            rows.append((year, firm, firm, int(len(year_firms[year]) > 1)))
+            # carried over the following gap if the firm comes back later
+            carried = firm if last_dominant[firm] > year else None
+        else:
+            rows.append((year, None, carried, 0))
+    return rows
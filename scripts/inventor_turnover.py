@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventor Turnover Metrics
+
+Computes the rows of firm_year_inventor_cnt.csv from the inventors of every
+firm and year, given as int arrays (firm code, year, inventor code) with one
+entry per inventor_year_dominant_firm row:
+
+    years, inventors, offsets = group_by_firm(firms, years, inventors)
+    firm_years(years[offsets[k]:offsets[k + 1]], ...)   # firm k
+
+Every firm-year keeps its inventors as a sorted array of unique ints, so the
+set algebra against last year's and the IPO year's inventors is done with
+np.intersect1d instead of Python sets of id strings. Each row has
+    num_inventors          - inventors that year (last year's in gaps)
+    loss, gain             - inventors gone since / new since the last year
+                             with inventors
+    ipo_inventors_left     - inventors of the IPO year not there this year
+    ipo_inventors_returned - inventors of the IPO year back this year that
+                             weren't there in the last year with inventors
+The last two are 'N/A' before the IPO year, which is the first year with
+inventors from the IPO date on.
+
+turnover_chunk() writes the rows of a range of firms as CSV text, so the
+firms can be split over a process pool (see init_worker).
+"""
+
+import csv
+import io
+
+import numpy as np
+
+
+def group_by_firm(firms, years, inventors):
+    """
+    Returns (years, inventors, offsets): the unique (firm, year, inventor)
+    rows sorted by firm code, year and inventor code, where the rows of firm
+    k are [offsets[k]:offsets[k + 1]].
+    """
+    firms = np.asarray(firms, dtype=np.int64)
+    years = np.asarray(years, dtype=np.int64)
+    inventors = np.asarray(inventors, dtype=np.int64)
+    order = np.lexsort((inventors, years, firms))
+    firms, years, inventors = firms[order], years[order], inventors[order]
+
+    # drop repeated rows (an inventor is counted once per firm-year)
+    kept = np.ones(len(order), dtype=bool)
+    kept[1:] = ((firms[1:] != firms[:-1]) | (years[1:] != years[:-1]) |
+                (inventors[1:] != inventors[:-1]))
+    firms, years, inventors = firms[kept], years[kept], inventors[kept]
+
+    offsets = np.zeros(int(firms.max()) + 2 if len(firms) else 1,
+                       dtype=np.int64)
+    np.cumsum(np.bincount(firms), out=offsets[1:])
+    return years, inventors, offsets
+
+
+def firm_years(years, inventors):
+    """
+    {year: sorted int array of inventors} of one firm, from its slice of
+    group_by_firm().
+    """
+    year_values, starts = np.unique(years, return_index=True)
+    bounds = starts.tolist() + [len(years)]
+    return {year: inventors[bounds[k]:bounds[k + 1]]
+            for k, year in enumerate(year_values.tolist())}
+
+
+def overlap(a, b):
+    """Number of inventors in both sorted arrays of unique ints."""
+    return len(np.intersect1d(a, b, assume_unique=True))
+
+
+def turnover(years, ipo_year, this_year):
+    """
+    Rows (year, num_inventors, loss, gain, ipo_inventors_left,
+    ipo_inventors_returned) of one firm, for its {year: inventors} from
+    firm_years(), from its first year up to this_year - 1. The first row only
+    has (year, num_inventors, 0, 0). None if the firm has no inventors from
+    the IPO year up to this_year.
+    """
+    while ipo_year not in years and ipo_year <= this_year:
+        ipo_year += 1
+    if ipo_year > this_year:
+        return None
+
+    ipo_inventors = years[ipo_year]
+    start = min(years)
+    rows = [(start, len(years[start]), 0, 0)]
+    last = years[start]
+    for i in range(start + 1, ipo_year):
+        if i not in years:
+            rows.append((i, len(last), 0, 0, 'N/A', 'N/A'))
+        else:
+            common = overlap(years[i], last)
+            rows.append((i, len(years[i]), len(last) - common,
+                         len(years[i]) - common, 'N/A', 'N/A'))
+            last = years[i]
+
+    for i in range(ipo_year, this_year):
+        if i not in years:
+            ipo_loss = len(ipo_inventors) - overlap(last, ipo_inventors)
+            rows.append((i, len(last), 0, 0, ipo_loss, 0))
+        else:
+            common = overlap(years[i], last)
+            ipo_year_intersect = np.intersect1d(years[i], ipo_inventors,
+                                                assume_unique=True)
+            ipo_loss = len(ipo_inventors) - len(ipo_year_intersect)
+            # ipo inventors in year i that weren't there in the last year
+            ipo_return = 0 if i == ipo_year else (
+                    len(ipo_year_intersect) - overlap(ipo_year_intersect, last))
+            rows.append((i, len(years[i]), len(last) - common,
+                         len(years[i]) - common, ipo_loss, ipo_return))
+            last = years[i]
+    return rows
+
+
+def init_worker(firm_names, ipo_years, years, inventors, offsets, this_year):
+    # every worker gets its own copy of the grouped inventor arrays
+    global worker_firm_names, worker_ipo_years, worker_years
+    global worker_inventors, worker_offsets, worker_this_year
+    worker_firm_names = firm_names
+    worker_ipo_years = ipo_years
+    worker_years = years
+    worker_inventors = inventors
+    worker_offsets = offsets
+    worker_this_year = this_year
+
+
+def turnover_chunk(bounds):
+    """
+    (CSV rows, skipped firms) of the firms bounds[0] to bounds[1] - 1, the
+    rows as text and the firms without inventors from their IPO year on as a
+    list of names.
+    """
+    text = io.StringIO()
+    output = csv.writer(text, delimiter=',')
+    skipped = []
+    for k in range(*bounds):
+        lo, hi = worker_offsets[k], worker_offsets[k + 1]
+        if lo == hi:
+            continue
+        firm = worker_firm_names[k]
+        rows = turnover(firm_years(worker_years[lo:hi], worker_inventors[lo:hi]),
+                        worker_ipo_years[k], worker_this_year)
+        if rows is None:
+            skipped.append(firm)
+            continue
+        for row in rows:
+            output.writerow((firm,) + row)
+    return text.getvalue(), skipped
@@ -18,92 +18,40 @@ and outputs/inventor_year_patents_fw.csv with header:
 
 import time
 import csv
+from tsv_reader import read_rows
+from citation_graph import load_graph
+from date_table import load_dates
+from cpc_index import load_cpc
+from id_codes import encode, get, load_ids
 
 print('***\nBEGIN PROCESS')
 start_time = time.ctime()
 
-# Load cpc_current
-cpc_current_file = open('../patent_data/cpc_current.tsv', 
-                            encoding='utf-8-sig')
-cpc_current = csv.DictReader(cpc_current_file, delimiter='\t')
+# Patents are handled as int codes (see id_codes.py), the per-patent 
+# lookups are arrays indexed by patent code
+patents = load_ids('patent')
 
-# Create patent to subsection_id and sequence dictionary
-print('Creating subsection dict\n...') 
-patent_to_subsection = {}
-for row in cpc_current:
-    if row['sequence'] == '0':
-        patent_to_subsection[row['patent_id']] = row['subsection_id']
-    
-# Load application
-app_file = open('../patent_data/application.tsv', 
-                        encoding='utf-8-sig')
-application = csv.DictReader(app_file, delimiter='\t') 
-    
-# Create application to year dictionary
-print('Creating application year dict and application to patent dict\n...')
-patent_to_app_year = {}
-app_to_patent = {}
-for row in application:
-    patent_to_app_year[row['patent_id']] = int(row['date'][:4])
-    app_to_patent[row['number'][5:]] = row['patent_id']
+# Load the subsection_id of the sequence 0 cpc row of every patent (built 
+# once, then memory-mapped)
+cpc = load_cpc()
 
-# Load patent
-patent_file = open('../patent_data/patent.tsv', 
-                        encoding='utf-8-sig')
-patent = csv.DictReader(patent_file, delimiter='\t') 
-    
-# Create patent to year dictionary
-print('Creating grant year dict\n...')
-patent_to_grant_year = {}
-for row in patent:
-    patent_to_grant_year[row['number']] = int(row['date'][:4])
-    
-# Load uspatentcitation
-uspatentcitation_file = open('../patent_data/uspatentcitation.tsv', 
-                            encoding='utf-8-sig')
-uspatentcitation = csv.DictReader(uspatentcitation_file, delimiter='\t')
+# Load the citation graph (built once, then memory-mapped)
+graph = load_graph()
 
+# Application and grant year tables (built once, then memory-mapped)
+dates = load_dates()
+patent_to_app_year = dates.app_year
+patent_to_grant_year = dates.grant_year
+    
 # Year range (for forward citations)
 year_range = 7
 
-# Create patent to citation dictionary, fw and bk
-print('Creating citations dict\n...')
-patent_to_citationbk = {}
-patent_to_citationfw = {}
-for row in uspatentcitation:
-    # Adding to backward citations
-    lstbk = patent_to_citationbk.get(row['patent_id'], [])
-    lstbk.append(row['citation_id'])
-    patent_to_citationbk[row['patent_id']] = lstbk
-    
-    # Adding to forward citations
-    if row['date']:
-        if (patent_to_app_year.get(row['patent_id'], 20000) - 
-                patent_to_app_year.get(row['citation_id'], 20000)) <= year_range:
-            lstfw = patent_to_citationfw.get(row['citation_id'], [])
-            lstfw.append(row['patent_id'])
-            patent_to_citationfw[row['citation_id']] = lstfw
-
-# Load usapplicationcitation
-usappcitation_file = open('../patent_data/usapplicationcitation.tsv', 
-                                encoding='utf-8-sig')
-usappcitation = csv.DictReader(usappcitation_file, delimiter='\t')
-
-# Add application citations
-print('Adding application citation\n...')
-for row in usappcitation:
-    if row['date']:
-        cit = app_to_patent.get(row['number'][5:])
-        if cit and (patent_to_app_year.get(row['patent_id'], 20000) - 
-                patent_to_app_year.get(cit, 0)) <= year_range:
-            lstfw = patent_to_citationfw.get(cit, [])
-            lstfw.append(row['patent_id'])
-            patent_to_citationfw[cit] = lstfw
-
 # Load inventor_patent
-inventor_to_patent_file = open('../outputs/inventor_patent.csv', 
-                               encoding='utf-8-sig')
-inventor_to_patent = csv.DictReader(inventor_to_patent_file)
+inventor_to_patent = list(read_rows('../outputs/inventor_patent.csv', 
+                                    ['inventor_id', 'patent_id'], 
+                                    delimiter=','))
+inventor_patent_codes = encode(
+        'patent', [patent for inventor, patent in inventor_to_patent]).tolist()
 
 # Write to output file
 print('Creating output files\n...')
@@ -122,32 +70,38 @@ with open(
                 'citation_grant_year', 'subsection_id']
     output_fw.writerow(header_fw)   
 
-    for row in inventor_to_patent:
+    for (inventor, patent), code in zip(inventor_to_patent, 
+                                        inventor_patent_codes):
+        app_year = get(patent_to_app_year, code, 'N/A')
+        grant_year = get(patent_to_grant_year, code, 'N/A')
+        
         # Writing backward citations
-        patent = row['patent_id']
-        for cit in patent_to_citationbk.get(patent, []):
+        for cit in graph.backward(code).tolist():
+            cit_id = patents[cit]
             output_bk.writerow([
-                row['inventor_id'], 
-                patent_to_app_year.get(patent, 'N/A'),
-                patent_to_grant_year.get(patent, 'N/A'),
+                inventor, 
+                app_year,
+                grant_year,
                 patent,
-                cit,
-                'Design' if cit[0] == 'D' else (
-                        patent_to_subsection.get(cit, 'N/A')),
+                cit_id,
+                'Design' if cit_id[0] == 'D' else (
+                        cpc.primary_subsection(cit, 'N/A')),
             ]) 
         
         # Writing forward citations
-        for cit in patent_to_citationfw.get(patent, []):
+        for cit in graph.forward(
+                code, year_range, missing_year=20000).tolist():
+            cit_id = patents[cit]
             output_fw.writerow([
-                row['inventor_id'], 
-                patent_to_app_year.get(patent, 'N/A'),
-                patent_to_grant_year.get(patent, 'N/A'),
+                inventor, 
+                app_year,
+                grant_year,
                 patent,
-                cit,
-                patent_to_app_year.get(cit, 'N/A'),
-                patent_to_grant_year.get(cit, 'N/A'),
-                'Design' if cit[0] == 'D' else (
-                        patent_to_subsection.get(cit, 'N/A')),
+                cit_id,
+                get(patent_to_app_year, cit, 'N/A'),
+                get(patent_to_grant_year, cit, 'N/A'),
+                'Design' if cit_id[0] == 'D' else (
+                        cpc.primary_subsection(cit, 'N/A')),
             ]) 
     
 print('***\nEND OF PROCESS')
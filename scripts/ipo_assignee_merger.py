@@ -7,174 +7,221 @@
 # Directions: put the patent data in a folder called 'patent_data', put the ipo data in a folder called 'firms'.
 # This script should be in its own folder (and it can be called whatever).
 #
-# NOTE: IPO FILE MUST BE IN ALPHABETICAL ORDER (and the assignee file should be too!)
+# Usage: python ipo_assignee_merger.py [--workers N] [--backend auto|rapidfuzz|fuzzywuzzy] [--incremental]
+#        --workers N matches the assignees in N processes (default 1), the output files are identical.
+#        --backend picks the fuzzy scoring library (see name_scoring.py), auto prefers rapidfuzz.
+#        --incremental only re-scores the pairs where the IPO firm or the assignee changed since the last run
+#        (see match_manifest.py), the output files are the same as a full run.
+#
+# NOTE: the IPO names are indexed in memory (see name_index.py), so neither input file needs to be sorted.
 ########################################################################################################################
+import argparse
 import csv
 import math
-from fuzzywuzzy import fuzz
-import re
+import multiprocessing
 import time
-from wordfreq import word_frequency
 import os.path
-
-
-def remove_common_substrings(str):
-    new_str = str.lower()
-    # remove parts of the string, must be at the end
-    new_str.replace(' holding', '')
-    new_str.replace(' holdings', '')
-    new_str = re.sub('\ technology$', '', new_str)
-    new_str = re.sub('\ technologies$', '', new_str)
-    new_str = re.sub('\ institute$', '', new_str)
-    new_str = re.sub('\ uk$', '', new_str)
-    new_str = re.sub('\ us$', '', new_str)
-    new_str = re.sub('\ gmbh$', '', new_str)
-    new_str = re.sub('\ co$', '', new_str)
-    new_str = re.sub('\ co.$', '', new_str)
-    new_str = re.sub('\ grp$', '', new_str)
-    new_str = re.sub('\ incorporated', '', new_str)
-    new_str = re.sub('\ inc.$', '', new_str)
-    new_str = re.sub('\ inc$', '', new_str)
-    new_str = re.sub('\ corp.$', '', new_str)
-    new_str = re.sub('\ corp$', '', new_str)
-    new_str = re.sub('\ ag$', '', new_str)
-    new_str = re.sub('\ ltd$', '', new_str)
-    new_str = re.sub('\ ag.$', '', new_str)
-    new_str = re.sub('\ ltd.$', '', new_str)
-    new_str = re.sub('\ limited$', '', new_str)
-    new_str = re.sub('\ company$', '', new_str)
-
-    return new_str
-
-
-# start time
-start_time = time.ctime()
-
-# load in the files
-assignee_file = open('../patent_data/assignee.tsv', encoding='utf-8-sig')
-assignee = csv.DictReader(assignee_file, delimiter="\t")
-
-ipo_file = open('../firms/ipo_10000.csv', encoding='utf-8-sig')
-ipo = csv.DictReader(ipo_file, delimiter=",")
-
-# create an output file
-output = open('../outputs/name_matches.csv', 'w',
-              newline="\n", encoding='utf-8-sig')
-name_matches = csv.writer(output, delimiter=',')
-header = ['ipo_firm', 'assignee_firm', 'ticker', 'is_common', 'patent_cnt']
-name_matches.writerow(header)
-
-# create a files of non-matches
-output = open('../outputs/assignee_firms_unmatched.tsv',
-              'w', newline="\n", encoding='utf-8-sig')
-non_assignee_matches = csv.writer(output, delimiter='\t')
-header = ['id', 'type', 'firm']
-non_assignee_matches.writerow(header)
-
-output = open('../outputs/ipo_firms_unmatched.csv',
-              'w', newline="\n", encoding='utf-8-sig')
-non_ipo_matches = csv.writer(output, delimiter=',')
-header = ['firm', 'ipo_date', 'ticker', 'CUSIP', 'CRSP perm',
-          'post-issue shares', 'dual dum', 'Founding', 'Rollup dum']
-# ['ipo_date', 'firm', 'ticker', 'offer_price', 'opening_price', 'first_day_close'] # old header
-non_ipo_matches.writerow(header)
-
-# count the number of patents per assignee
-print('GENERATING PATENT COUNT PER ASSIGNEE')
-patent_cnt = {}  # dictionary mapping assignee id to patent counts
-# if not os.path.isfile('../patent_data/assignee_firms_patent_count.tsv'):  # first check to see if such a file exists
-with open('../patent_data/patent_assignee.tsv', encoding='utf-8-sig') as patent_assignee_file:
-    patent_assignee = csv.DictReader(patent_assignee_file, delimiter="\t")
-
-    # iterate through the patent_assignee file and generate the dictionary
-    for row in patent_assignee:
-        patent_id = row['patent_id']
-        assignee_id = row['assignee_id']
-
+import common_names
+from match_manifest import content_hash, ipo_hashes, load_manifest, save_manifest
+from name_index import build_index
+from name_normalizer import normalize_name
+from name_scoring import get_backend
+from tsv_cache import load_columns
+
+
+def init_worker(index, backend, changed_index=None):
+    # each worker gets its own read-only copy of the IPO indexes and its own scorer
+    global ipo_index, changed_ipo_index, score_matches
+    ipo_index = index
+    changed_ipo_index = changed_index
+    _, score_matches = get_backend(backend)
+
+
+def match_chunk(chunk):
+    # match a chunk of (id, type, firm, kept) assignee rows against the IPO index
+    # kept is None to score against every IPO firm, or (incremental runs) the IPO firms the unchanged
+    # assignee matched last time, in which case only the changed IPO firms are scored
+    # returns one (id, type, firm, [ipo index entry, ...]) per assignee, matches in IPO file order
+    results = []
+    for id, type, firm, kept in chunk:
+        # remove the common substrings (memoized, each name is normalized once)
+        modified_firm = normalize_name(firm)
+        if kept is None:
+            index = ipo_index
+            matches = []
+        else:
+            index = changed_ipo_index
+            matches = [entry for ipo_firm in kept for entry in ipo_index.by_firm[ipo_firm]]
+
+        # the index only returns the ipo firms where
+        # 1. the ipo string prefixes the assignee string
+        # 2. the ipo string first word is in the words of the assignee string
+        candidates = index.candidates(modified_firm)
+        if candidates:
+            # 3. check that the ipo and assignee have string similarity by substring or by similarity of word sets
+            #    (partial_ratio or token_sort_ratio >= 90, all candidates scored in one call)
+            for k in score_matches(modified_firm, [entry[2] for entry in candidates]):
+                matches.append(candidates[k])
+
+        matches.sort()
+        results.append((id, type, firm, matches))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match IPO firms to patent assignees.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of matching processes (default 1)')
+    parser.add_argument('--backend', default='auto',
+                        choices=['auto', 'rapidfuzz', 'fuzzywuzzy'],
+                        help='fuzzy scoring backend (default auto)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-score pairs that changed since the last run')
+    args = parser.parse_args()
+
+    # pick the scoring backend once, so a missing library fails before any work is done
+    backend, _ = get_backend(args.backend)
+    print('SCORING BACKEND: ' + backend)
+
+    # start time
+    start_time = time.ctime()
+
+    # load in the files
+    assignee = load_columns('../patent_data/assignee.tsv', ['id', 'type', 'firm'])
+
+    ipo_file = open('../firms/ipo_10000.csv', encoding='utf-8-sig')
+    ipo = csv.DictReader(ipo_file, delimiter=",")
+
+    # create an output file
+    output = open('../outputs/name_matches.csv', 'w',
+                  newline="\n", encoding='utf-8-sig')
+    name_matches = csv.writer(output, delimiter=',')
+    header = ['ipo_firm', 'assignee_firm', 'ticker', 'is_common', 'patent_cnt']
+    name_matches.writerow(header)
+
+    # create a files of non-matches
+    output = open('../outputs/assignee_firms_unmatched.tsv',
+                  'w', newline="\n", encoding='utf-8-sig')
+    non_assignee_matches = csv.writer(output, delimiter='\t')
+    header = ['id', 'type', 'firm']
+    non_assignee_matches.writerow(header)
+
+    output = open('../outputs/ipo_firms_unmatched.csv',
+                  'w', newline="\n", encoding='utf-8-sig')
+    non_ipo_matches = csv.writer(output, delimiter=',')
+    header = ['firm', 'ipo_date', 'ticker', 'CUSIP', 'CRSP perm',
+              'post-issue shares', 'dual dum', 'Founding', 'Rollup dum']
+    # ['ipo_date', 'firm', 'ticker', 'offer_price', 'opening_price', 'first_day_close'] # old header
+    non_ipo_matches.writerow(header)
+
+    # count the number of patents per assignee
+    print('GENERATING PATENT COUNT PER ASSIGNEE')
+    patent_cnt = {}  # dictionary mapping assignee id to patent counts
+    # if not os.path.isfile('../patent_data/assignee_firms_patent_count.tsv'):  # first check to see if such a file exists
+    patent_assignee = load_columns('../patent_data/patent_assignee.tsv', ['assignee_id'])
+
+    # iterate through the patent_assignee assignee ids and generate the dictionary
+    for assignee_id in patent_assignee['assignee_id'].tolist():
         if assignee_id not in patent_cnt:
             patent_cnt[assignee_id] = 1
         else:
             patent_cnt[assignee_id] += 1
-print('COMPLETED')
-
-print('*** IPO and ASSIGNEE INPUT SIZES ***')
-# calculate the size of both input files
-assignee_size = len([1 for i in assignee])
-print('assignee size: ' + str(assignee_size))
-assignee_file.seek(0)  # rewind file
-assignee.__next__()
-
-ipo_size = len([1 for i in ipo])
-print('ipo size: ' + str(ipo_size) + '\n')
-ipo_file.seek(0)  # rewind file
-ipo.__next__()
-
-# set of IPO to keep track of what has been matched
-unmatched_ipo = set()
-
-for row in ipo:
-    ipo_firm = row['firm'].strip()
-    unmatched_ipo.add(ipo_firm)
-
-ipo_file.seek(0)  # rewind file
-ipo.__next__()
-
-# count for progress
-cnt = 0
-previous_percent = 0
-curr_letter = '0'  # to allow for firms that start with numbers
-
-for row in assignee:
-    # calculate progress
-    if len(row['firm']) != 0:
-        percent_complete = math.floor((cnt / assignee_size) * 100)
-        if percent_complete > previous_percent:
-            print(str(percent_complete) + '% complete')
-            previous_percent = percent_complete
-
-        # .strip() removes the white space around the string (some name have spaces after)
-        id = row['id'].strip()
-        type = row['type'].strip()
-        firm = row['firm'].strip()
-        found_match = False
-
-        # set the curr_letter as the first letter of this string
-        if not firm.lower().startswith(curr_letter):
-            curr_letter = firm[0].lower()
-            # print(curr_letter)
-
-        for i in ipo:
-            ipo_firm = i['firm'].strip()
-
-            if not ipo_firm.lower().startswith(curr_letter):
-                # continue through if we're before the current assignee letter
-                if ipo_firm[0] < curr_letter:
-                    continue
-                else:
-                    break  # if we're after the current assignee letter, break out of loop
-
-            # remove the common substrings
-            modified_firm = remove_common_substrings(firm)
-            modified_ipo_firm = remove_common_substrings(ipo_firm)
-
-            # 1. check that the ipo string prefixes the assignee string
-            # 2. check that the ipo string first word is in the words of the assignee string
-            # 3. check that the ipo and assignee have string similarity by substring or by similarity of word sets
-            if modified_firm.startswith(modified_ipo_firm) and \
-                    re.sub("[^\w]", " ", modified_ipo_firm).split()[0] in re.sub("[^\w]", " ", modified_firm).split() and \
-                    (fuzz.partial_ratio(modified_firm, modified_ipo_firm) >= 90 or
-                     fuzz.token_sort_ratio(modified_firm, modified_ipo_firm) >= 90):
+    print('COMPLETED')
+
+    print('*** IPO and ASSIGNEE INPUT SIZES ***')
+    # keep the assignees to match in memory so they can be split into chunks
+    # .strip() removes the white space around the string (some name have spaces after)
+    assignee_rows = [[id.strip(), type.strip(), firm.strip(), None]
+                     for id, type, firm in zip(assignee['id'].tolist(), assignee['type'].tolist(),
+                                               assignee['firm'].tolist())
+                     if len(firm) != 0]
+    assignee_size = len(assignee_rows)
+    print('assignee size: ' + str(assignee_size))
+
+    # the IPO list is small, keep it in memory instead of rewinding it per assignee
+    ipo_rows = list(ipo)
+    ipo_size = len(ipo_rows)
+    print('ipo size: ' + str(ipo_size) + '\n')
+
+    # set of IPO to keep track of what has been matched
+    unmatched_ipo = set()
+
+    for row in ipo_rows:
+        ipo_firm = row['firm'].strip()
+        unmatched_ipo.add(ipo_firm)
+
+    # index the (normalized) IPO names once
+    print('INDEXING IPO FIRMS')
+    index = build_index(ipo_rows, normalize_name)
+    print('COMPLETED')
+
+    # look up which IPO names are common words, wordfreq is only loaded for names not in the cached table
+    print('LOADING COMMON IPO NAMES')
+    added = common_names.precompute([normalize_name(row['firm'].strip()) for row in ipo_rows])
+    print('COMPLETED (' + str(added) + ' new names)')
+
+    # hash both inputs, so the next --incremental run can tell what changed
+    ipo_hash = ipo_hashes(ipo_rows)
+    assignee_hash = {row[0]: content_hash(row[:3]) for row in assignee_rows}
+
+    changed_index = None
+    manifest = load_manifest() if args.incremental else None
+    if manifest:
+        # only the new or changed IPO firms are scored against the unchanged assignees
+        changed_ipo = {firm for firm, h in ipo_hash.items() if manifest['ipo'].get(firm) != h}
+        changed_index = build_index(ipo_rows, normalize_name, changed_ipo)
+
+        rescored = 0
+        for row in assignee_rows:
+            if manifest['assignee'].get(row[0]) == assignee_hash[row[0]]:
+                # keep the earlier matches with IPO firms that are still there and unchanged
+                row[3] = [ipo_firm for ipo_firm in manifest['matches'].get(row[0], [])
+                          if ipo_firm not in changed_ipo and ipo_firm in index.by_firm]
+            else:
+                rescored += 1
+        print('INCREMENTAL: ' + str(len(changed_ipo)) + ' new or changed IPO firms, ' +
+              str(rescored) + ' new or changed assignees')
+    elif args.incremental:
+        print('INCREMENTAL: no manifest from an earlier run, matching everything')
+
+    # split the assignees into chunks, a few per worker so progress keeps moving
+    chunk_size = max(1, min(10000, math.ceil(assignee_size / (args.workers * 8))))
+    chunks = [assignee_rows[k:k + chunk_size]
+              for k in range(0, assignee_size, chunk_size)]
+
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, init_worker, (index, backend, changed_index))
+        # imap hands the chunks back in order, which keeps the output deterministic
+        results = pool.imap(match_chunk, chunks)
+    else:
+        pool = None
+        init_worker(index, backend, changed_index)
+        results = map(match_chunk, chunks)
+
+    # count for progress
+    cnt = 0
+    previous_percent = 0
+
+    # assignee id -> matched IPO firms, for the manifest
+    matched_firms = {}
+
+    for chunk_results in results:
+        for id, type, firm, matches in chunk_results:
+            # calculate progress
+            percent_complete = math.floor((cnt / assignee_size) * 100)
+            if percent_complete > previous_percent:
+                print(str(percent_complete) + '% complete')
+                previous_percent = percent_complete
+
+            if matches:
+                matched_firms[id] = sorted({entry[1] for entry in matches})
+
+            for _, ipo_firm, modified_ipo_firm, _, i in matches:
                 print('ipo: ' + ipo_firm)
                 print('assignee: ' + firm + '\n')
-                # print(modified_ipo_firm)
-                # print(modified_firm)
-                # print(fuzz.partial_ratio(modified_firm, modified_ipo_firm))
-                # print(fuzz.token_sort_ratio(modified_firm, modified_ipo_firm))
 
-                is_common = 1
                 # check if the IPO name is common
-                if word_frequency(modified_ipo_firm, 'en') < 0.000001:
-                    is_common = 0
+                is_common = common_names.is_common(modified_ipo_firm)
 
                 # write it to the matches output, and record a found match
                 if id not in patent_cnt:
@@ -183,34 +230,39 @@ for row in assignee:
                 name_matches.writerow(
                     [ipo_firm, firm, i['ticker'].strip(), is_common, patent_cnt[id]])
 
-                found_match = True
-
                 # remove from list of unmatched ipo
                 if ipo_firm in unmatched_ipo:
                     unmatched_ipo.remove(ipo_firm)
 
-        # if a match isn't found, return it to the "non-matched" pile
-        if not found_match:
-            non_assignee_matches.writerow([id, type, firm])
-        # this rewinds the csv reader
-        ipo_file.seek(0)
-        ipo.__next__()
+            # if a match isn't found, return it to the "non-matched" pile
+            if not matches:
+                non_assignee_matches.writerow([id, type, firm])
+
+            cnt += 1
+
+    if pool:
+        pool.close()
+        pool.join()
+
+    save_manifest(ipo_hash, assignee_hash, matched_firms)
+
+    for i in ipo_rows:
+        ipo_firm = i['firm'].strip()
+        if ipo_firm in unmatched_ipo:
+            non_ipo_matches.writerow(
+                [i['firm'], i['ipo_date'], i['ticker'], i['CUSIP'], i['CRSP perm'], i['post-issue shares'], i['dual dum'],
+                 i['Founding'], i['Rollup dum']])
+            # [i['ipo_date'], i['firm'], i['ticker'], i['offer_price'], i['opening_price'], i['first_day_close']] # using
+            # old header
 
-        cnt += 1
+    # END OF PROCESS ##
+    print('\nEND OF PROCESS\n')
 
-for i in ipo:
-    ipo_firm = i['firm'].strip()
-    if ipo_firm in unmatched_ipo:
-        non_ipo_matches.writerow(
-            [i['firm'], i['ipo_date'], i['ticker'], i['CUSIP'], i['CRSP perm'], i['post-issue shares'], i['dual dum'],
-             i['Founding'], i['Rollup dum']])
-        # [i['ipo_date'], i['firm'], i['ticker'], i['offer_price'], i['opening_price'], i['first_day_close']] # using
-        # old header
+    end_time = time.ctime()
 
-# END OF PROCESS ##
-print('\nEND OF PROCESS\n')
+    print('Start Time: ' + start_time)
+    print('End Time: ' + end_time)
 
-end_time = time.ctime()
 
-print('Start Time: ' + start_time)
-print('End Time: ' + end_time)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Name Match Manifest
+
+Remembers what ipo_assignee_merger.py saw and matched on its last run, so
+that an --incremental run only re-scores the pairs where the IPO firm or
+the assignee is new or changed.
+
+The manifest is outputs/name_matches_manifest.json with
+    ipo:      IPO firm -> content hash of its row(s) in ipo_10000.csv
+    assignee: assignee id -> content hash of its (id, type, firm)
+    matches:  assignee id -> IPO firms it matched
+"""
+
+import hashlib
+import json
+import os.path
+
+MANIFEST_PATH = '../outputs/name_matches_manifest.json'
+
+
+def content_hash(values):
+    """Short, stable hash of a list of strings."""
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'),
+                           digest_size=8).hexdigest()
+
+
+def ipo_hashes(ipo_rows):
+    """IPO firm -> hash over every row of that firm, in file order."""
+    rows = {}
+    for row in ipo_rows:
+        rows.setdefault(row['firm'].strip(), []).extend(
+            '' if value is None else str(value) for value in row.values())
+    return {firm: content_hash(values) for firm, values in rows.items()}
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Returns the manifest of the last run, or None if there is none."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(ipo, assignee, matches, path=MANIFEST_PATH):
+    """Writes the manifest of this run (written to a temp file, then moved)."""
+    with open(path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump({'ipo': ipo, 'assignee': assignee, 'matches': matches},
+                  manifest_file)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IPO Name Index
+
+In-memory index over the IPO firm names, built once and used by
+ipo_assignee_merger.py to find the IPO firms an assignee could match.
+
+An assignee is only a candidate match for an IPO firm if
+    1. the normalized IPO name prefixes the normalized assignee name, and
+    2. the first word of the normalized IPO name is one of the words of the
+       normalized assignee name.
+
+Rule 1 is answered by walking a character trie of the normalized IPO names
+along the assignee name, rule 2 by comparing each IPO name's first-word
+blocking key against the assignee's word set. Neither input has to be sorted.
+"""
+
+from name_normalizer import name_words
+
+# trie key marking the end of a normalized IPO name (never a single character)
+END = ''
+
+
+class NameIndex:
+    """Prefix trie plus first-word blocking keys over the IPO firm list."""
+
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.trie = {}
+        # firm -> its entries, for looking up earlier matches by name
+        self.by_firm = {}
+
+    def add(self, ipo_firm, row, position):
+        """Adds one IPO row under its (stripped) firm name."""
+        modified_ipo_firm = self.normalize(ipo_firm)
+        words = name_words(modified_ipo_firm)
+        if not words:
+            # no first word, so rule 2 can never pass
+            return
+
+        node = self.trie
+        for ch in modified_ipo_firm:
+            node = node.setdefault(ch, {})
+        # (position in the IPO file, firm, normalized firm, blocking key, row)
+        entry = (position, ipo_firm, modified_ipo_firm, words[0], row)
+        node.setdefault(END, []).append(entry)
+        self.by_firm.setdefault(ipo_firm, []).append(entry)
+
+    def candidates(self, modified_firm):
+        """
+        Returns the IPO entries passing rules 1 and 2 for a normalized
+        assignee name, in IPO file order.
+        """
+        found = []
+        node = self.trie
+        for ch in modified_firm:
+            node = node.get(ch)
+            if node is None:
+                break
+            if END in node:
+                found.extend(node[END])
+
+        if not found:
+            return found
+
+        firm_words = set(name_words(modified_firm))
+        found = [entry for entry in found if entry[3] in firm_words]
+        found.sort()
+        return found
+
+
+def build_index(ipo, normalize, firms=None):
+    """
+    Builds a NameIndex over the rows of ipo_10000.csv, or over only the rows
+    whose firm is in firms (the entries keep their position in the file).
+    """
+    index = NameIndex(normalize)
+    for position, row in enumerate(ipo):
+        ipo_firm = row['firm'].strip()
+        if firms is None or ipo_firm in firms:
+            index.add(ipo_firm, row, position)
+    return index
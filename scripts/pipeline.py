@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline Runner
+
+Runs the scripts in dependency order. Every stage declares the files it
+reads and writes (STAGES below), a stage runs after the stages writing its
+inputs, and stages that don't depend on each other run at the same time,
+e.g. the firm measures and the inventor branch after firm_year_inventor.py.
+
+A stage is skipped when it is up to date: its script (and the scripts it
+imports) and its inputs have the same content hash as on its last
+successful run, and its outputs are still the ones that run wrote. The
+hashes are kept in ../outputs/.cache/pipeline.json (a file is only hashed
+again when its modification time or size changes), the output of every
+stage in ../outputs/.cache/pipeline_logs/<stage>.log.
+
+Kenneth's scripts run from the repository folder and read dependent_data/.
+The runner links (or copies) their inputs there from outputs/, firms/ and
+patent_data/, the data that doesn't come from this repository
+(analyst_coverage.csv, poison_pill_coverage.csv and his ipo_10000.csv with
+'Offer date') has to be put in dependent_data/ by hand. Stages with a
+missing input are reported and left out, with the stages that need them.
+
+Usage: python pipeline.py [STAGE ...] [--jobs N] [--force] [--dry-run]
+    STAGE      only run these stages and the stages they need (default all)
+    --jobs N   number of stages running at the same time (default 2)
+    --force    run the stages even if they are up to date
+    --dry-run  only print what would run
+
+@author: Audrey Yang (auyang@seas.upenn.edu)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tsv_cache import temp_path
+import citation_graph
+import id_codes
+import inventor_partition
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STATE_PATH = '../outputs/.cache/pipeline.json'
+
+LOG_DIR = '../outputs/.cache/pipeline_logs'
+
+# PatentsView tables behind the patent codes and the citation graph
+PATENT_CODES = list(dict.fromkeys(path for path, _ in id_codes.SOURCES['patent']))
+GRAPH = PATENT_CODES + [path for path in citation_graph.SOURCES
+                        if path.endswith('.tsv')]
+
+INVENTOR_PARTITION = [inventor_partition.INVENTOR_PATENT] + [
+        path for path in inventor_partition.SOURCES if path.endswith('.tsv')]
+
+
+def stage(script, inputs, outputs, links=None, after=()):
+    """
+    A stage running script with inputs and outputs (paths relative to this
+    folder). links maps the dependent_data/ path of a Kenneth script to the
+    file it is linked to, Kenneth's scripts run from the repository folder.
+    after names stages that have to run first without writing an input,
+    the ones building a cache (date_table, citation_graph, cpc_index,
+    inventor_partition), so the stages using it don't all build it at the
+    same time.
+    """
+    return {'name': script[:-3],
+            'script': script,
+            'inputs': list(inputs) + list((links or {}).values()),
+            'outputs': list(outputs),
+            'links': links or {},
+            'after': list(after),
+            'cwd': '..' if links is not None else '.'}
+
+
+STAGES = [
+    stage('date_table.py', PATENT_CODES, []),
+    stage('ipo_assignee_merger.py',
+          ['../firms/ipo_10000.csv', '../patent_data/assignee.tsv',
+           '../patent_data/patent_assignee.tsv'],
+          ['../outputs/name_matches.csv',
+           '../outputs/assignee_firms_unmatched.tsv',
+           '../outputs/ipo_firms_unmatched.csv'],
+          after=['date_table']),
+    # writes the application year panel too (adjust_application_date.py
+    # rebuilds it by hand from dependent_data/)
+    stage('firm_year_patent.py',
+          PATENT_CODES + ['../outputs/name_matches.csv',
+                          '../firms/ipo_10000.csv',
+                          '../patent_data/assignee.tsv'],
+          ['../outputs/firm_year_patentcnt.csv',
+           '../outputs/firm_year_patentcnt_REVISED.csv'],
+          after=['date_table']),
+    stage('citation_graph.py', GRAPH, [], after=['date_table']),
+    stage('cpc_index.py', PATENT_CODES, [], after=['citation_graph']),
+    stage('firm_year_patents.py',
+          GRAPH + ['../outputs/firm_year_patentcnt_REVISED.csv'],
+          ['../outputs/firm_year_patents.csv'],
+          after=['citation_graph', 'cpc_index']),
+    stage('firm_originality_generality.py',
+          GRAPH + ['../outputs/firm_year_patentcnt_REVISED.csv'],
+          ['../outputs/firm_originality_generality.csv'],
+          after=['citation_graph', 'cpc_index']),
+    stage('firm_forward_citation_cnt.py',
+          GRAPH + ['../outputs/firm_year_patentcnt_REVISED.csv'],
+          ['../outputs/firm_forward_citation_cnt.csv'],
+          after=['citation_graph', 'cpc_index']),
+    stage('firm_year_panel.py',
+          ['../dependent_data/analyst_coverage.csv',
+           '../dependent_data/ipo_10000.csv',
+           '../dependent_data/poison_pill_coverage.csv'],
+          ['../outputs/f_y_i_analyst.csv'],
+          links={'../dependent_data/firm_year_patentcnt_REVISED.csv':
+                     '../outputs/firm_year_patentcnt_REVISED.csv',
+                 '../dependent_data/firm_originality_generality.csv':
+                     '../outputs/firm_originality_generality.csv',
+                 '../dependent_data/firm_forward_citation_cnt.csv':
+                     '../outputs/firm_forward_citation_cnt.csv'}),
+    stage('firm_year_inventor.py',
+          PATENT_CODES + ['../outputs/firm_year_patentcnt_REVISED.csv',
+                          '../patent_data/assignee.tsv',
+                          '../patent_data/inventor.tsv',
+                          '../patent_data/inventor_gender.tsv',
+                          '../patent_data/location.tsv'],
+          ['../outputs/firm_year_inventor.csv', '../outputs/inventor_patent.csv']),
+    stage('inventor_year_patents.py',
+          GRAPH + ['../outputs/inventor_patent.csv'],
+          ['../outputs/inventor_year_patents_bk.csv',
+           '../outputs/inventor_year_patents_fw.csv'],
+          after=['citation_graph', 'cpc_index']),
+    stage('inventor_originality_generality.py',
+          PATENT_CODES + ['../outputs/inventor_patent.csv',
+                          '../outputs/inventor_year_patents_bk.csv',
+                          '../outputs/inventor_year_patents_fw.csv'],
+          ['../outputs/inventor_originality_generality.csv'],
+          after=['date_table']),
+    stage('inventor_partition.py', PATENT_CODES + INVENTOR_PARTITION, [],
+          after=['date_table', 'citation_graph']),
+    stage('inventor_forward_citation_cnt.py', GRAPH + INVENTOR_PARTITION,
+          ['../outputs/inventor_forward_citation_cnt.csv'],
+          after=['citation_graph', 'inventor_partition']),
+    stage('inventor_year_dominant_firm.py',
+          PATENT_CODES + INVENTOR_PARTITION + [
+              '../patent_data/assignee.tsv', '../outputs/name_matches.csv',
+              '../outputs/inventor_year_patents_bk.csv'],
+          ['../outputs/inventor_year_dominant_firm.csv'],
+          after=['inventor_partition']),
+    stage('firm_year_inventor_cnt.py',
+          ['../firms/ipo_10000.csv',
+           '../outputs/inventor_year_dominant_firm.csv'],
+          ['../outputs/firm_year_inventor_cnt.csv']),
+    stage('inventor_firm_range.py',
+          PATENT_CODES + INVENTOR_PARTITION + [
+              '../patent_data/assignee.tsv', '../outputs/name_matches_2.csv'],
+          ['../outputs/inventor_timeline.csv'],
+          after=['inventor_partition']),
+]
+
+
+def file_hash(path, hashes):
+    """
+    Content hash of a file, remembered in hashes by path with the
+    modification time and size it was computed for.
+    """
+    stat = os.stat(path)
+    known = hashes.get(path)
+    if known and known[:2] == [stat.st_mtime_ns, stat.st_size]:
+        return known[2]
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b''):
+            digest.update(block)
+    hashes[path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+    return hashes[path][2]
+
+
+def code_files(script):
+    """The script and the scripts of this folder it imports, recursively."""
+    files = []
+    todo = [script]
+    while todo:
+        name = todo.pop()
+        path = os.path.join(SCRIPTS_DIR, name)
+        if name in files or not os.path.isfile(path):
+            continue
+        files.append(name)
+        with open(path, encoding='utf-8') as code_file:
+            for module in re.findall(r'^\s*(?:from|import)\s+(\w+)',
+                                     code_file.read(), re.MULTILINE):
+                todo.append(module + '.py')
+    return sorted(files)
+
+
+def fingerprint(stage, hashes):
+    """Hash over the code and the inputs of a stage."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in code_files(stage['script']):
+        digest.update((name + file_hash(os.path.join(SCRIPTS_DIR, name),
+                                        hashes)).encode('utf-8'))
+    for path in sorted(set(stage['inputs'])):
+        digest.update((path + file_hash(path, hashes)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def up_to_date(stage, stage_fingerprint, state):
+    """True if the last run of the stage had these inputs and outputs."""
+    last = state['stages'].get(stage['name'])
+    if not last or last['fingerprint'] != stage_fingerprint:
+        return False
+    for path in stage['outputs']:
+        if (not os.path.isfile(path) or
+                last['outputs'].get(path) != file_hash(path, state['hashes'])):
+            return False
+    return True
+
+
+def link(source, path):
+    """Hard links path to source, copying it if the file system can't."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
+def run_stage(stage):
+    """Runs the script of a stage, returns (exit code, seconds)."""
+    for path, source in stage['links'].items():
+        link(source, path)
+    start = time.time()
+    with open(os.path.join(LOG_DIR, stage['name'] + '.log'), 'w',
+              encoding='utf-8') as log_file:
+        returncode = subprocess.call(
+                [sys.executable, os.path.join(SCRIPTS_DIR, stage['script'])],
+                cwd=stage['cwd'], stdout=log_file, stderr=subprocess.STDOUT)
+    return returncode, time.time() - start
+
+
+def load_state():
+    if os.path.isfile(STATE_PATH):
+        with open(STATE_PATH, encoding='utf-8') as state_file:
+            return json.load(state_file)
+    return {'hashes': {}, 'stages': {}}
+
+
+def save_state(state):
+    with open(temp_path(STATE_PATH), 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path(STATE_PATH), STATE_PATH)
+
+
+def needed_stages(names):
+    """The stages called names and every stage they need, in STAGES order."""
+    producer = {path: stage['name'] for stage in STAGES
+                for path in stage['outputs']}
+    stages = {stage['name']: stage for stage in STAGES}
+    needed = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo += [producer[path] for path in stages[name]['inputs']
+                     if path in producer] + stages[name]['after']
+    return [stage for stage in STAGES if stage['name'] in needed]
+
+
+def run(stages, jobs=2, force=False, dry_run=False):
+    """Runs the stages in dependency order, returns the failed stages."""
+    producer = {path: stage['name'] for stage in stages
+                for path in stage['outputs']}
+    names = {stage['name'] for stage in stages}
+    needs = {stage['name']: {producer[path] for path in stage['inputs']
+                             if path in producer} |
+                            (set(stage['after']) & names)
+             for stage in stages}
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    state = load_state()
+    done = set()
+    rerun = set()       # stages that run (or would run) this time
+    failed = set()
+    pending = list(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max(1, jobs)) as executor:
+        while pending or running:
+            for stage in list(pending):
+                name = stage['name']
+                if needs[name] & failed:
+                    pending.remove(stage)
+                    failed.add(name)
+                    print('[blocked]    ' + name + ' (needs ' +
+                          ', '.join(sorted(needs[name] & failed)) + ')')
+                    continue
+                if not needs[name] <= done or len(running) >= max(1, jobs):
+                    continue
+                pending.remove(stage)
+
+                missing = [path for path in stage['inputs']
+                           if not os.path.isfile(path) and
+                           not (dry_run and path in producer)]
+                if missing:
+                    failed.add(name)
+                    print('[missing]    ' + name + ': ' + ', '.join(missing))
+                    continue
+
+                # in a dry run the inputs of a stage after one that would
+                # run aren't there yet, so it would run too
+                upstream_rerun = dry_run and needs[name] & rerun
+                stage_fingerprint = (None if upstream_rerun
+                                     else fingerprint(stage, state['hashes']))
+                if (not force and not upstream_rerun and
+                        up_to_date(stage, stage_fingerprint, state)):
+                    done.add(name)
+                    print('[up to date] ' + name)
+                    continue
+
+                rerun.add(name)
+                if dry_run:
+                    done.add(name)
+                    print('[would run]  ' + name)
+                    continue
+                print('[running]    ' + name)
+                running[executor.submit(run_stage, stage)] = (
+                        stage, stage_fingerprint)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, stage_fingerprint = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode:
+                    failed.add(stage['name'])
+                    print('[failed]     ' + stage['name'] + ' (see ' +
+                          os.path.join(LOG_DIR, stage['name'] + '.log') + ')')
+                    continue
+                done.add(stage['name'])
+                state['stages'][stage['name']] = {
+                    'fingerprint': stage_fingerprint,
+                    'outputs': {path: file_hash(path, state['hashes'])
+                                for path in stage['outputs']
+                                if os.path.isfile(path)},
+                }
+                save_state(state)
+                print('[done]       ' + stage['name'] +
+                      ' ({:.1f} s)'.format(seconds))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Runs the scripts in dependency order.')
+    parser.add_argument('stages', nargs='*', metavar='STAGE',
+                        help='stages to run, with the stages they need '
+                             '(default all)')
+    parser.add_argument('--jobs', type=int, default=2,
+                        help='number of stages running at the same time '
+                             '(default 2)')
+    parser.add_argument('--force', action='store_true',
+                        help='run the stages even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only print what would run')
+    args = parser.parse_args()
+    names = [stage['name'] for stage in STAGES]
+    for name in args.stages:
+        if name not in names:
+            parser.error('unknown stage ' + name + ' (stages: ' +
+                         ', '.join(names) + ')')
+
+    stages = needed_stages(args.stages) if args.stages else STAGES
+    failed = run(stages, args.jobs, args.force, args.dry_run)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
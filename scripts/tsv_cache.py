@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar TSV Cache
+
+Converts the PatentsView TSVs (application.tsv, patent.tsv, cpc_current.tsv,
+uspatentcitation.tsv, ...) into typed NumPy columns the first time a column
+is asked for, and memory-maps them on every later load, so the text is only
+parsed once (by all cores, see tsv_reader.py).
+
+    from tsv_cache import load_columns
+    application = load_columns('../patent_data/application.tsv',
+                               {'patent_id': 'str', 'date': 'year'})
+    application['patent_id']  # numpy array, one entry per row
+
+Column types:
+    str  - the field as is
+    int  - int(field)
+    year - int(field[:4]), e.g. the year of a yyyy-mm-dd date
+    date - a yyyy-mm-dd date as the int yyyymmdd
+
+The cache for ../patent_data/application.tsv lives in
+../patent_data/.cache/application/ as one .npy file per (column, type) plus
+meta.json. It is rebuilt when the modification time or size of the TSV
+changes.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from tsv_reader import read_columns
+
+
+def cache_dir(path):
+    """Cache folder of a TSV: <folder>/.cache/<name without extension>/."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, '.cache', os.path.splitext(name)[0])
+
+
+def source_stamp(path):
+    """Modification time and size of the source file."""
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def temp_path(path):
+    """
+    Where to write a file before moving it to path, unique per process so
+    that scripts building the same cache at the same time don't collide.
+    """
+    return path + '.' + str(os.getpid()) + '.tmp'
+
+
+def write_array(directory, name, array):
+    """Saves an array as <directory>/<name>.npy."""
+    path = os.path.join(directory, name + '.npy')
+    with open(temp_path(path), 'wb') as npy_file:
+        np.save(npy_file, array)
+    os.replace(temp_path(path), path)
+
+
+def column_file(column, type):
+    return column + '-' + type + '.npy'
+
+
+def read_meta(directory):
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, encoding='utf-8') as meta_file:
+        return json.load(meta_file)
+
+
+def write_meta(directory, meta):
+    meta_path = os.path.join(directory, 'meta.json')
+    with open(temp_path(meta_path), 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(temp_path(meta_path), meta_path)
+
+
+def build_columns(path, columns, directory, delimiter='\t'):
+    """
+    Parses the TSV once (in a process pool, see tsv_reader.py) and saves the
+    requested (column, type) pairs.
+    """
+    print('Caching ' + ', '.join(column for column, _ in columns) +
+          ' of ' + path + '\n...')
+    arrays = read_columns(path, dict(columns), delimiter)
+
+    for column, type in columns:
+        write_array(directory, column + '-' + type, arrays.pop(column))
+
+
+def load_columns(path, columns, delimiter='\t'):
+    """
+    Returns {column: read-only numpy array} for the requested columns of a
+    TSV, caching any column that is not cached yet. columns is a list of
+    column names (loaded as 'str') or a {column: type} dict.
+    """
+    if not isinstance(columns, dict):
+        columns = {column: 'str' for column in columns}
+
+    directory = cache_dir(path)
+    os.makedirs(directory, exist_ok=True)
+
+    stamp = source_stamp(path)
+    meta = read_meta(directory)
+    if meta is None or meta['source'] != stamp:
+        # the TSV changed (or was never cached): drop the columns cached from
+        # the old TSV, but not the files of other caches in the folder or
+        # the columns another script is building without a meta yet, which
+        # are overwritten atomically anyway
+        for name in meta['columns'] if meta is not None else []:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        meta = {'source': stamp, 'columns': []}
+
+    missing = [(column, type) for column, type in columns.items()
+               if column_file(column, type) not in meta['columns']]
+    if missing:
+        build_columns(path, missing, directory, delimiter)
+        meta['columns'] += [column_file(column, type) for column, type in missing]
+        # keep the columns another script cached in the meantime
+        current = read_meta(directory)
+        if current is not None and current['source'] == stamp:
+            meta['columns'] += [name for name in current['columns']
+                                if name not in meta['columns']]
+        write_meta(directory, meta)
+
+    return {column: np.load(os.path.join(directory, column_file(column, type)),
+                            mmap_mode='r')
+            for column, type in columns.items()}
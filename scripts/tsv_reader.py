@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel TSV Reader
+
+Reads the requested columns of a PatentsView TSV (or of a CSV with
+delimiter=',') without building a dict per row: the column indexes are
+looked up in the header once and only the requested fields are kept.
+
+    from tsv_reader import read_batches, read_columns, read_rows
+    for patent_id, year in read_rows('../patent_data/application.tsv',
+                                     {'patent_id': 'str', 'date': 'year'}):
+        ...                 # one tuple per row, in file order
+
+    citations = read_columns('../patent_data/uspatentcitation.tsv',
+                             {'patent_id': 'str', 'date': 'year'})
+    citations['date']       # numpy array, one entry per row
+
+    for batch in read_batches(path, ['patent_id', 'number']):
+        batch['number']     # the rows of one range, in file order
+
+Column types:
+    str  - the field as is
+    int  - int(field)
+    year - int(field[:4]), e.g. the year of a yyyy-mm-dd date
+    date - a yyyy-mm-dd date as the int yyyymmdd
+
+read_rows streams the rows in this process. read_columns and read_batches
+split the file into byte ranges that end on a newline and parse every range
+in a process of a pool, so a big TSV is parsed on all cores.
+
+The rows come out as csv.reader reads them: blank lines are skipped and
+short rows are filled with ''. A quoted field can hold a newline, so a range
+is only parsed on its own while no field before it starts with a quote;
+from the first range that has one the rest of the file is parsed in order
+in this process.
+
+Running this file compares the time and peak memory of reading each file
+(path:column,column,...) into a list of csv.DictReader rows, a list of
+read_rows tuples and read_columns arrays:
+    python tsv_reader.py ../patent_data/application.tsv:patent_id,date
+"""
+
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import time
+import tracemalloc
+from operator import itemgetter
+
+import numpy as np
+
+# bytes per range handed to a worker
+CHUNK_BYTES = 32 * 1024 * 1024
+
+# rows parsed before they are packed into a numpy chunk
+CHUNK_ROWS = 1000000
+
+CONVERTERS = {
+    'str': str,
+    'int': int,
+    'year': lambda field: int(field[:4]),
+    'date': lambda field: int(field[:4] + field[5:7] + field[8:10]),
+}
+
+DTYPES = {
+    'str': np.str_,
+    'int': np.int64,
+    'year': np.int32,
+    'date': np.int32,
+}
+
+
+def read_header(path, delimiter='\t'):
+    """(column names, byte offset of the first row)"""
+    with open(path, 'rb') as tsv_file:
+        line = tsv_file.readline()
+    header = next(csv.reader([line.decode('utf-8-sig').rstrip('\r\n')],
+                             delimiter=delimiter))
+    return header, len(line)
+
+
+def byte_ranges(path, start, chunk_bytes=CHUNK_BYTES):
+    """[(start, end)] byte ranges of about chunk_bytes from start, each ending
+    after a newline (or at the end of the file)."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as tsv_file:
+        while start < size:
+            tsv_file.seek(min(start + chunk_bytes, size))
+            tsv_file.readline()
+            end = min(tsv_file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def quoted(data, delimiter):
+    """Whether a field of the rows in data starts with a quote."""
+    if b'"' not in data:
+        return False
+    return (data.startswith(b'"') or b'\n"' in data or b'\r"' in data or
+            delimiter.encode() + b'"' in data)
+
+
+def parse_rows(lines, header_len, indexes, types, delimiter):
+    """Yields the typed columns of the rows in lines, CHUNK_ROWS at a time."""
+    converters = [CONVERTERS[type] for type in types]
+    values = [[] for _ in indexes]
+    for row in csv.reader(lines, delimiter=delimiter):
+        # csv.DictReader skips blank lines and fills short rows
+        if not row:
+            continue
+        if len(row) < header_len:
+            row += [''] * (header_len - len(row))
+        for k, i in enumerate(indexes):
+            values[k].append(converters[k](row[i]))
+        if len(values[0]) == CHUNK_ROWS:
+            yield [np.array(v, dtype=DTYPES[type])
+                   for v, type in zip(values, types)]
+            values = [[] for _ in indexes]
+    if values and values[0]:
+        yield [np.array(v, dtype=DTYPES[type]) for v, type in zip(values, types)]
+
+
+def parse_range(task):
+    """
+    The typed columns of the rows in a byte range as one array each, None if
+    a field in it starts with a quote.
+    """
+    path, (start, end), header_len, indexes, types, delimiter = task
+    with open(path, 'rb') as tsv_file:
+        tsv_file.seek(start)
+        data = tsv_file.read(end - start)
+    if quoted(data, delimiter):
+        return None
+    lines = io.StringIO(data.decode('utf-8'), newline='')
+    chunks = list(parse_rows(lines, header_len, indexes, types, delimiter))
+    if not chunks:
+        return [np.array([], dtype=DTYPES[type]) for type in types]
+    return [np.concatenate(arrays) for arrays in zip(*chunks)]
+
+
+def parse_rest(path, start, header_len, indexes, types, delimiter):
+    """Yields the typed columns of the rows from byte start to the end."""
+    with open(path, 'rb') as tsv_file:
+        tsv_file.seek(start)
+        lines = io.TextIOWrapper(tsv_file, encoding='utf-8', newline='')
+        yield from parse_rows(lines, header_len, indexes, types, delimiter)
+
+
+def column_types(columns):
+    """{column: type} of a list of column names ('str') or a dict."""
+    if not isinstance(columns, dict):
+        columns = {column: 'str' for column in columns}
+    return columns
+
+
+def read_batches(path, columns, delimiter='\t', workers=None,
+                 chunk_bytes=CHUNK_BYTES):
+    """
+    Yields {column: numpy array} batches of the rows of a TSV, in file
+    order. columns is a list of column names (read as 'str') or a
+    {column: type} dict. The batches are parsed in workers processes
+    (all cores by default).
+    """
+    columns = column_types(columns)
+    header, start = read_header(path, delimiter)
+    indexes = [header.index(column) for column in columns]
+    types = list(columns.values())
+    ranges = byte_ranges(path, start, chunk_bytes)
+    workers = min(workers or os.cpu_count(), len(ranges))
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        tasks = [(path, bounds, len(header), indexes, types, delimiter)
+                 for bounds in ranges]
+        try:
+            # imap hands the ranges back in order
+            for (range_start, _), arrays in zip(ranges,
+                                                pool.imap(parse_range, tasks)):
+                if arrays is None:
+                    start = range_start
+                    break
+                yield dict(zip(columns, arrays))
+            else:
+                start = None
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if start is not None:
+        for arrays in parse_rest(path, start, len(header), indexes, types,
+                                 delimiter):
+            yield dict(zip(columns, arrays))
+
+
+def read_columns(path, columns, delimiter='\t', workers=None,
+                 chunk_bytes=CHUNK_BYTES):
+    """{column: numpy array} of the requested columns of a TSV (see
+    read_batches)."""
+    columns = column_types(columns)
+    chunks = {column: [] for column in columns}
+    for batch in read_batches(path, columns, delimiter, workers, chunk_bytes):
+        for column, array in batch.items():
+            chunks[column].append(array)
+    return {column: np.concatenate(chunks[column]) if chunks[column] else
+            np.array([], dtype=DTYPES[type])
+            for column, type in columns.items()}
+
+
+def read_rows(path, columns, delimiter='\t'):
+    """
+    Yields the requested fields of every row, as a tuple in the order of
+    columns. columns is a list of column names (read as 'str') or a
+    {column: type} dict.
+    """
+    columns = column_types(columns)
+    with open(path, encoding='utf-8-sig', newline='') as tsv_file:
+        reader = csv.reader(tsv_file, delimiter=delimiter)
+        header = next(reader)
+        indexes = [header.index(column) for column in columns]
+        width = len(header)
+        if all(type == 'str' for type in columns.values()):
+            if len(indexes) == 1:
+                # itemgetter of one index returns the field, not a tuple
+                def fields(row, i=indexes[0]):
+                    return (row[i],)
+            else:
+                fields = itemgetter(*indexes)
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row += [''] * (width - len(row))
+                yield fields(row)
+        else:
+            converters = list(zip([CONVERTERS[type] for type in columns.values()],
+                                  indexes))
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row += [''] * (width - len(row))
+                yield tuple(convert(row[i]) for convert, i in converters)
+
+
+def read_dicts(path, delimiter='\t'):
+    """The rows as dicts, read with csv.DictReader."""
+    with open(path, encoding='utf-8-sig', newline='') as tsv_file:
+        return list(csv.DictReader(tsv_file, delimiter=delimiter))
+
+
+def measure(run):
+    """(seconds, peak MB allocated in this process) of run()"""
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Time and peak memory of csv.DictReader and of the '
+                        'readers of this module.')
+    parser.add_argument('files', nargs='+', metavar='path:columns',
+                        help='file and comma separated columns to read')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes of the parallel reader')
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / 2**20,
+                        help='MB per range')
+    args = parser.parse_args()
+    chunk_bytes = max(1, int(args.chunk_mb * 2**20))
+
+    for spec in args.files:
+        path, columns = spec.rsplit(':', 1)
+        columns = columns.split(',')
+        delimiter = ',' if path.endswith('.csv') else '\t'
+        mb = os.path.getsize(path) / 2**20
+        ranges = byte_ranges(path, read_header(path, delimiter)[1], chunk_bytes)
+        print('{}: {:.1f} MB, {} ranges'.format(path, mb, len(ranges)))
+
+        runs = [
+            ('csv.DictReader', lambda: read_dicts(path, delimiter)),
+            ('read_rows', lambda: list(read_rows(path, columns, delimiter))),
+            ('read_columns, 1 process', lambda: read_columns(
+                    path, columns, delimiter, 1, chunk_bytes)),
+        ]
+        if args.workers > 1:
+            runs.append(('read_columns, {} processes'.format(args.workers),
+                         lambda: read_columns(path, columns, delimiter,
+                                              args.workers, chunk_bytes)))
+        for name, run in runs:
+            seconds, peak = measure(run)
+            print('  {:<28}{:8.2f} s {:8.1f} MB/s {:8.1f} MB peak'.format(
+                    name, seconds, mb / seconds, peak))
+
+
+if __name__ == '__main__':
+    main()